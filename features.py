@@ -0,0 +1,401 @@
+# features.py
+# -----------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Fixed-length feature vectors of game states, and evaluation functions that
+weigh them: a LinearEvaluation is compiled from its weights into a function
+that computes only the features it uses, and scores batches of states with
+whole-array NumPy operations.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The features, in the order of a feature vector.  Distances are Manhattan
+# distances from Pacman unless they are through the maze; those to things
+# that are not there are 0.
+FEATURES = (
+    'bias',                 # always 1
+    'score',                # the game score
+    'foodLeft',             # pellets left
+    'nearestFood',          # distance to the nearest pellet
+    'meanFood',             # mean distance to the pellets
+    'foodInverseSum',       # sum of 1 / distance over the pellets not under Pacman
+    'capsulesLeft',         # capsules left
+    'nearestCapsule',       # distance to the nearest capsule
+    'nearestGhost',         # distance to the nearest ghost that is not scared
+    'nearestScaredGhost',   # distance to the nearest scared ghost
+    'ghostsNear',           # ghosts that are not scared within 2 steps
+    'scaredGhosts',         # ghosts that are scared
+    'nearestFoodMaze',      # maze distance to the nearest pellet
+    'nearestCapsuleMaze',   # maze distance to the nearest capsule
+)
+
+# How a compiled evaluation computes each feature of a state: the
+# intermediate values it needs (see INTERMEDIATES) and a Python expression
+# over them and data, the state's GameStateData.
+FEATURE_CODE = {
+    'bias': ((), '1'),
+    'score': ((), 'data.score'),
+    'foodLeft': ((), 'data.food.count()'),
+    'nearestFood': (('foodDistances',), '(foodDistances.min() if len(foodDistances) else 0)'),
+    'meanFood': (('foodDistances',), '(foodDistances.mean() if len(foodDistances) else 0)'),
+    'foodInverseSum': (('cell', 'food'), 'extractor.inverses[cell][food].sum()'),
+    'capsulesLeft': ((), 'len(data.capsules)'),
+    'nearestCapsule': (('capsuleDistances',), 'min(capsuleDistances, default=0)'),
+    'nearestGhost': (('ghostDistances',), 'min(ghostDistances, default=0)'),
+    'nearestScaredGhost': (('ghostDistances',), 'min(scaredDistances, default=0)'),
+    'ghostsNear': (('ghostDistances',), 'sum(1 for distance in ghostDistances if distance <= 2)'),
+    'scaredGhosts': (('ghostDistances',), 'len(scaredDistances)'),
+    'nearestFoodMaze': (('pacman',), 'finite(data.foodField.getDistance(pacman))'),
+    'nearestCapsuleMaze': (('pacman',), 'finite(data.capsuleField.getDistance(pacman))'),
+}
+
+# The values shared between features: the ones each needs first, and the
+# statements that compute it.  Listed in an order that respects the needs.
+INTERMEDIATES = (
+    ('pacman', (), ['pacman = data.agentStates[0].configuration.pos']),
+    ('extractor', (), ['extractor = getFeatureExtractor(data.layout)']),
+    ('cell', ('pacman', 'extractor'), ['cell = extractor.getCell(pacman)']),
+    ('food', ('extractor',), ['food = extractor.getFoodMask(data.food)']),
+    ('foodDistances', ('cell', 'food'), ['foodDistances = extractor.distances[cell][food]']),
+    ('capsuleDistances', ('cell', 'extractor'),
+     ['capsuleDistances = [extractor.distances[cell, extractor.getCell(capsule)] for capsule in data.capsules]']),
+    ('ghostDistances', ('pacman',), [
+        'px, py = pacman',
+        'ghostDistances = []',
+        'scaredDistances = []',
+        'for ghostState in data.agentStates[1:]:',
+        '    gx, gy = ghostState.configuration.pos',
+        '    if ghostState.scaredTimer > 0:',
+        '        scaredDistances.append(abs(gx - px) + abs(gy - py))',
+        '    else:',
+        '        ghostDistances.append(abs(gx - px) + abs(gy - py))',
+    ]),
+)
+
+def compileFeatures(names, weights=None):
+    """
+    Returns a function of a game state computing the features in names,
+    which work out the intermediate values they share once: as a list in the
+    order of names or, given their weights, as the weighted sum.
+    """
+    needed = set()
+    for name in names:
+        if name not in FEATURE_CODE:
+            raise Exception('Unknown feature: ' + name)
+        needed.update(FEATURE_CODE[name][0])
+    for name, needs, statements in reversed(INTERMEDIATES):
+        if name in needed:
+            needed.update(needs)
+
+    lines = ['def evaluate(gameState):', '    data = gameState.data']
+    for name, needs, statements in INTERMEDIATES:
+        if name in needed:
+            lines += ['    ' + statement for statement in statements]
+    expressions = [FEATURE_CODE[name][1] for name in names]
+    if weights == None:
+        lines.append('    return [%s]' % ', '.join(expressions))
+    elif expressions:
+        lines.append('    return ' + ' + '.join('%r * %s' % (float(weights[name]), expression)
+                                               for name, expression in zip(names, expressions)))
+    else:
+        lines.append('    return 0.0')
+    source = '\n'.join(lines) + '\n'
+    namespace = {'getFeatureExtractor': getFeatureExtractor, 'finite': finite}
+    exec(compile(source, '<features %s>' % ' '.join(names), 'exec'), namespace)
+    evaluate = namespace['evaluate']
+    evaluate.source = source
+    return evaluate
+
+class LeafBatch:
+    """
+    Game states collected to be evaluated together, e.g. the search leaves
+    below one node for an evaluation function's batchEvaluate, which scores
+    them all at once and returns an array of values in the order the states
+    were added.  Each state is copied when it is added, so a SearchState may
+    be added and then rewound.
+
+    getArrays fills in, for n states and g ghosts:
+
+      pacmanPositions   n x 2
+      ghostPositions    n x g x 2
+      scaredTimers      n x g
+      foodMasks         n x width x height, True where there is food
+      capsuleMasks      n x width x height, True where there is a capsule
+      scores            n
+
+    The states' DistanceFields are kept in foodFields and capsuleFields.
+    """
+
+    def __init__(self, layout):
+        if numpy == None:
+            raise Exception('Batched evaluation needs NumPy')
+        self.layout = layout
+        self.width = layout.width
+        self.height = layout.height
+        self.foodBytes = (self.width * self.height + 7) // 8
+        self.pacman = []
+        self.ghosts = []
+        self.timers = []
+        self.food = []
+        self.capsules = []
+        self.score = []
+        self.foodFields = []
+        self.capsuleFields = []
+
+    def add(self, gameState):
+        agentStates = gameState.data.agentStates
+        self.pacman.append(agentStates[0].configuration.pos)
+        self.ghosts.append([s.configuration.pos for s in agentStates[1:]])
+        self.timers.append([s.scaredTimer for s in agentStates[1:]])
+        self.food.append(gameState.data.food.bits.to_bytes(self.foodBytes, 'little'))
+        self.capsules.append(gameState.data.capsules)
+        self.score.append(gameState.data.score)
+        self.foodFields.append(gameState.data.foodField)
+        self.capsuleFields.append(gameState.data.capsuleField)
+
+    def __len__(self):
+        return len(self.score)
+
+    def getArrays(self):
+        n = len(self)
+        self.pacmanPositions = numpy.array(self.pacman, dtype=float).reshape(n, 2)
+        self.ghostPositions = numpy.array(self.ghosts, dtype=float).reshape(n, -1, 2)
+        self.scaredTimers = numpy.array(self.timers, dtype=int).reshape(n, -1)
+        # Grid bits run up each column in turn, as x * height + y
+        bits = numpy.frombuffer(b''.join(self.food), dtype=numpy.uint8).reshape(n, self.foodBytes)
+        bits = numpy.unpackbits(bits, axis=1, bitorder='little')[:, :self.width * self.height]
+        self.foodMasks = bits.reshape(n, self.width, self.height).astype(bool)
+        self.capsuleMasks = numpy.zeros((n, self.width, self.height), dtype=bool)
+        for i, capsules in enumerate(self.capsules):
+            for x, y in capsules:
+                self.capsuleMasks[i, x, y] = True
+        self.scores = numpy.array(self.score, dtype=float)
+
+    def getMazeDistances(self, fields):
+        """
+        The maze distance from Pacman to the nearest target of each state's
+        field in fields, 0 where there is none.
+        """
+        return numpy.array([finite(field.getDistance(pos)) for field, pos in zip(fields, self.pacman)],
+                           dtype=float)
+
+class FeatureExtractor:
+    """
+    Computes the FEATURES of game states on one board.  The Manhattan
+    distance (and its inverse) between every two cells is kept as a table,
+    indexed like the bits of a Grid by x * height + y, so the distances from
+    Pacman to all the pellets are one row of it picked out by the food bits.
+    """
+
+    def __init__(self, layout):
+        if numpy == None:
+            raise Exception('Feature extraction needs NumPy')
+        self.layout = layout
+        self.height = layout.height
+        self.numCells = layout.width * layout.height
+        self.foodBytes = (self.numCells + 7) // 8
+        xs, ys = numpy.divmod(numpy.arange(self.numCells), self.height)
+        self.distances = (abs(xs[:, None] - xs[None, :]) + abs(ys[:, None] - ys[None, :])).astype(float)
+        self.inverses = numpy.where(self.distances > 0, 1.0 / numpy.maximum(self.distances, 1), 0)
+
+    def getCell(self, pos):
+        x, y = pos
+        return int(x + 0.5) * self.height + int(y + 0.5)
+
+    def getFoodMask(self, food):
+        """
+        The cells of the food Grid as a flat boolean array.
+        """
+        bits = numpy.frombuffer(food.bits.to_bytes(self.foodBytes, 'little'), dtype=numpy.uint8)
+        return numpy.unpackbits(bits, count=self.numCells, bitorder='little').view(bool)
+
+    def getFeatures(self, gameState):
+        """
+        Returns the feature vector of gameState.
+        """
+        return numpy.array(ALL_FEATURES(gameState), dtype=float)
+
+    def getBatchFeatures(self, batch, names=FEATURES):
+        """
+        Returns the n x len(names) features of a LeafBatch whose arrays have
+        been filled in.
+        """
+        n = len(batch)
+        wanted = set(names)
+        pacman = batch.pacmanPositions
+        if wanted & {'nearestFood', 'meanFood', 'foodInverseSum', 'nearestCapsule'}:
+            cells = (pacman[:, 0] + 0.5).astype(int) * self.height + (pacman[:, 1] + 0.5).astype(int)
+            distances = self.distances[cells]
+        if wanted & {'foodLeft', 'nearestFood', 'meanFood', 'foodInverseSum'}:
+            food = batch.foodMasks.reshape(n, -1)
+            foodLeft = food.sum(axis=1)
+        if wanted & {'nearestGhost', 'nearestScaredGhost', 'ghostsNear', 'scaredGhosts'}:
+            ghostDistances = abs(batch.ghostPositions - pacman[:, None, :]).sum(axis=2)
+            scared = batch.scaredTimers > 0
+
+        features = numpy.empty((n, len(names)))
+        for i, name in enumerate(names):
+            if name == 'bias':
+                column = 1
+            elif name == 'score':
+                column = batch.scores
+            elif name == 'foodLeft':
+                column = foodLeft
+            elif name == 'nearestFood':
+                column = nearest(distances, food, axis=1)
+            elif name == 'meanFood':
+                column = (distances * food).sum(axis=1) / numpy.maximum(foodLeft, 1)
+            elif name == 'foodInverseSum':
+                column = (self.inverses[cells] * food).sum(axis=1)
+            elif name == 'capsulesLeft':
+                column = batch.capsuleMasks.reshape(n, -1).sum(axis=1)
+            elif name == 'nearestCapsule':
+                column = nearest(distances, batch.capsuleMasks.reshape(n, -1), axis=1)
+            elif name == 'nearestGhost':
+                column = nearest(ghostDistances, ~scared, axis=1)
+            elif name == 'nearestScaredGhost':
+                column = nearest(ghostDistances, scared, axis=1)
+            elif name == 'ghostsNear':
+                column = (~scared & (ghostDistances <= 2)).sum(axis=1)
+            elif name == 'scaredGhosts':
+                column = scared.sum(axis=1)
+            elif name == 'nearestFoodMaze':
+                column = batch.getMazeDistances(batch.foodFields)
+            elif name == 'nearestCapsuleMaze':
+                column = batch.getMazeDistances(batch.capsuleFields)
+            else:
+                raise Exception('Unknown feature: ' + name)
+            features[:, i] = column
+        return features
+
+def nearest(distances, mask, axis):
+    """
+    The smallest of the distances where mask is True, or 0 where it is
+    True nowhere.
+    """
+    smallest = numpy.where(mask, distances, numpy.inf).min(axis=axis, initial=numpy.inf)
+    return numpy.where(numpy.isinf(smallest), 0, smallest)
+
+def finite(distance):
+    """
+    The distance, or 0 if it is inf.
+    """
+    return 0 if distance == float('inf') else distance
+
+FEATURE_EXTRACTORS = {}
+
+def getFeatureExtractor(layout):
+    """
+    Returns the FeatureExtractor for the board of layout, shared by every
+    layout with the same text.  It is kept on the layout as well, so the
+    evaluations of a state do not look it up by text each time.
+    """
+    extractor = getattr(layout, 'featureExtractor', None)
+    if extractor == None:
+        text = "\n".join(layout.layoutText)
+        if text not in FEATURE_EXTRACTORS:
+            FEATURE_EXTRACTORS[text] = FeatureExtractor(layout)
+        extractor = layout.featureExtractor = FEATURE_EXTRACTORS[text]
+    return extractor
+
+ALL_FEATURES = compileFeatures(FEATURES)
+
+class LinearEvaluation:
+    """
+    An evaluation function that is a weighted sum of features: weights maps
+    names in FEATURES to their weights, and features left out weigh 0.  The
+    weights are compiled into a function that computes only the features
+    with a weight other than 0, sharing the work they have in common (see
+    compileFeatures).  It is called like any evaluation function and has a
+    batchEvaluate for a whole LeafBatch, so batched searches can use it as
+    well.
+    """
+
+    def __init__(self, weights):
+        for name in weights:
+            if name not in FEATURES:
+                raise Exception('Unknown feature: ' + name)
+        self.weights = dict((name, float(weight)) for name, weight in weights.items())
+        self.names = [name for name in FEATURES if self.weights.get(name, 0) != 0]
+        self.evaluate = compileFeatures(self.names, self.weights)
+        self.vector = None
+        if numpy != None:
+            self.vector = numpy.array([self.weights[name] for name in self.names])
+
+    def __call__(self, gameState):
+        return float(self.evaluate(gameState))
+
+    def batchEvaluate(self, batch):
+        extractor = getFeatureExtractor(batch.layout)
+        return extractor.getBatchFeatures(batch, self.names).dot(self.vector)
+
+    def __getstate__(self):
+        # the compiled function is made again from the weights
+        state = self.__dict__.copy()
+        del state['evaluate']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.evaluate = compileFeatures(self.names, self.weights)
+
+    def __repr__(self):
+        return 'LinearEvaluation(%r)' % self.weights
+
+def readEvaluationSpec(lines):
+    """
+    Reads the weights of a LinearEvaluation from lines of the form
+
+      # a comment
+      feature: weight
+
+    as in the files of loadEvaluationSpec.
+    """
+    weights = {}
+    for number, line in enumerate(lines):
+        line = line.split('#')[0].strip()
+        if line == '':
+            continue
+        if ':' not in line:
+            raise Exception('Bad line %d of evaluation spec: %s' % (number + 1, line))
+        name, weight = [part.strip() for part in line.split(':', 1)]
+        if name not in FEATURES:
+            raise Exception('Unknown feature: ' + name)
+        weights[name] = float(weight)
+    return weights
+
+def loadEvaluationSpec(path):
+    """
+    Returns the weights in the evaluation spec file at path.
+    """
+    with open(path) as f:
+        return readEvaluationSpec(f.readlines())
+
+def specEvaluation(path=None, weights={}):
+    """
+    Returns the LinearEvaluation of the spec file at path, if any, with
+    weights added or replacing those of the file.  Agents make this from
+    evalFn=spec:path, and evalFn=spec takes all the weights from their other
+    arguments (e.g. -a evalFn=spec,score=1,nearestFood=-0.5).
+    """
+    specWeights = loadEvaluationSpec(path) if path else {}
+    for name, weight in weights.items():
+        if name not in FEATURES:
+            raise Exception('Unknown feature: ' + name)
+        specWeights[name] = float(weight)
+    return LinearEvaluation(specWeights)
@@ -21,6 +21,9 @@
 # For more info, see http://inst.eecs.berkeley.edu/~cs188/sp09/pacman.html
 
 from util import *
+from collections import namedtuple
+from array import array
+import heapq
 import time
 import os
 import traceback
@@ -71,6 +74,12 @@ class Directions:
                WEST: EAST,
                STOP: STOP}
 
+    # Small-int codes used inside the engine; agents, recordings and test
+    # solutions use the names.  Codes follow the order of legal action lists,
+    # so the set bits of an action mask list actions in the usual order.
+    NAMES = (WEST, STOP, EAST, NORTH, SOUTH)
+    CODES = {WEST: 0, STOP: 1, EAST: 2, NORTH: 3, SOUTH: 4}
+
 
 class Configuration:
     """
@@ -79,11 +88,44 @@ class Configuration:
 
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
+
+    Configurations are immutable and interned per layout: while a game is
+    played there is a single instance per (position, direction), so
+    Configuration(pos, direction) returns the existing one and equality is
+    identity.
     """
+    __slots__ = ('pos', 'direction', 'directionCode', '_hash', '_successors')
+
+    # The table of the layout last passed to useLayout
+    _interned = {}
 
-    def __init__(self, pos, direction):
-        self.pos = pos
-        self.direction = direction
+    def useLayout(layout):
+        """
+        Interns the Configurations made from now on in the table of layout.
+        Game states call this when they are set up, so each layout keeps its
+        own table, no bigger than the positions of that layout.
+        """
+        Configuration._interned = layout.getConfigurationTable()
+    useLayout = staticmethod(useLayout)
+
+    def __new__(cls, pos, direction):
+        key = (pos, direction)
+        conf = cls._interned.get(key)
+        if conf == None:
+            conf = object.__new__(cls)
+            object.__setattr__(conf, 'pos', pos)
+            object.__setattr__(conf, 'direction', direction)
+            object.__setattr__(conf, 'directionCode', Directions.CODES.get(direction))
+            object.__setattr__(conf, '_hash', hash(key))
+            object.__setattr__(conf, '_successors', {})
+            cls._interned[key] = conf
+        return conf
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Configurations are immutable')
+
+    def __reduce__(self):
+        return (Configuration, (self.pos, self.direction))
 
     def getPosition(self):
         return (self.pos)
@@ -96,14 +138,10 @@ class Configuration:
         return x == int(x) and y == int(y)
 
     def __eq__(self, other):
-        if other == None:
-            return False
-        return (self.pos == other.pos and self.direction == other.direction)
+        return self is other
 
     def __hash__(self):
-        x = hash(self.pos)
-        y = hash(self.direction)
-        return hash(x + 13 * y)
+        return self._hash
 
     def __str__(self):
         return "(x,y)="+str(self.pos)+", "+str(self.direction)
@@ -116,27 +154,56 @@ class Configuration:
 
         Actions are movement vectors.
         """
-        x, y = self.pos
-        dx, dy = vector
-        direction = Actions.vectorToDirection(vector)
-        if direction == Directions.STOP:
-            direction = self.direction  # There is no stop direction
-        return Configuration((x + dx, y+dy), direction)
+        successor = self._successors.get(vector)
+        if successor == None:
+            x, y = self.pos
+            dx, dy = vector
+            direction = Actions.vectorToDirection(vector)
+            if direction == Directions.STOP:
+                direction = self.direction  # There is no stop direction
+            successor = Configuration((x + dx, y+dy), direction)
+            self._successors[vector] = successor
+        return successor
 
 
-class AgentState:
+AgentStateFields = namedtuple('AgentStateFields', ['start', 'configuration', 'isPacman', 'scaredTimer',
+                                                   'numCarrying', 'numReturned', 'hashValue'])
+
+
+class AgentState(AgentStateFields):
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
+
+    AgentStates are immutable (they are tuples underneath): use replace() to
+    get a changed one, and GameStateData.setAgentState() to put it in a state.
     """
+    __slots__ = ()
 
-    def __init__(self, startConfiguration, isPacman):
-        self.start = startConfiguration
-        self.configuration = startConfiguration
-        self.isPacman = isPacman
-        self.scaredTimer = 0
-        # state below potentially used for contest only
-        self.numCarrying = 0
-        self.numReturned = 0
+    def __new__(cls, startConfiguration, isPacman, configuration=None, scaredTimer=0,
+                numCarrying=0, numReturned=0):
+        if configuration == None:
+            configuration = startConfiguration
+        # numCarrying and numReturned are potentially used for contest only
+        return tuple.__new__(cls, (startConfiguration, configuration, isPacman, scaredTimer,
+                                   numCarrying, numReturned, hash((configuration, scaredTimer))))
+
+    def __reduce__(self):
+        return (AgentState, (self.start, self.isPacman, self.configuration, self.scaredTimer,
+                             self.numCarrying, self.numReturned))
+
+    def _make(cls, iterable):
+        """
+        Builds an AgentState from its fields in order, for namedtuple's _make
+        and _replace; hashValue is always recomputed, never taken over.
+        """
+        start, configuration, isPacman, scaredTimer, numCarrying, numReturned = tuple(iterable)[:6]
+        return AgentState(start, isPacman, configuration, scaredTimer, numCarrying, numReturned)
+    _make = classmethod(_make)
+
+    def _replace(self, **fields):
+        if 'hashValue' in fields:
+            raise AttributeError('hashValue follows the configuration and scared timer')
+        return AgentStateFields._replace(self, **fields)
 
     def __str__(self):
         if self.isPacman:
@@ -145,20 +212,30 @@ class AgentState:
             return "Ghost: " + str(self.configuration)
 
     def __eq__(self, other):
-        if other == None:
+        if not isinstance(other, AgentState):
             return False
-        return self.configuration == other.configuration and self.scaredTimer == other.scaredTimer
+        return self.configuration is other.configuration and self.scaredTimer == other.scaredTimer
+
+    def __ne__(self, other):
+        return not self == other
 
     def __hash__(self):
-        return hash(hash(self.configuration) + 13 * hash(self.scaredTimer))
+        return self.hashValue
 
     def copy(self):
-        state = AgentState(self.start, self.isPacman)
-        state.configuration = self.configuration
-        state.scaredTimer = self.scaredTimer
-        state.numCarrying = self.numCarrying
-        state.numReturned = self.numReturned
-        return state
+        return self
+
+    def replace(self, configuration=None, scaredTimer=None):
+        """
+        Returns an AgentState like this one but with the given fields changed.
+        """
+        if configuration == None:
+            configuration = self.configuration
+        if scaredTimer == None:
+            scaredTimer = self.scaredTimer
+        return tuple.__new__(AgentState, (self.start, configuration, self.isPacman, scaredTimer,
+                                          self.numCarrying, self.numReturned,
+                                          hash((configuration, scaredTimer))))
 
     def getPosition(self):
         if self.configuration == None:
@@ -171,33 +248,50 @@ class AgentState:
 
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.  Data is accessed
-    via grid[x][y] where (x,y) are positions on a Pacman map with x horizontal,
-    y vertical and the origin (0,0) in the bottom left corner.
+    A 2-dimensional array of booleans backed by a single integer bitboard.  Data
+    is accessed via grid[x][y] where (x,y) are positions on a Pacman map with x
+    horizontal, y vertical and the origin (0,0) in the bottom left corner.
+
+    Cell (x,y) is stored in bit x * height + y of self.bits.  Since ints are
+    immutable, copy() is O(1), count() is a popcount and the hash of a grid is
+    the hash of its bitboard.
 
     The __str__ method constructs an output that is oriented like a pacman board.
     """
+    __slots__ = ('width', 'height', 'bits')
+
+    CELLS_PER_INT = 30
 
     def __init__(self, width, height, initialValue=False, bitRepresentation=None):
         if initialValue not in [False, True]:
             raise Exception('Grids can only contain booleans')
-        self.CELLS_PER_INT = 30
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(
-            height)] for x in range(width)]
+        if initialValue:
+            self.bits = (1 << (width * height)) - 1
+        else:
+            self.bits = 0
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
     def __getitem__(self, i):
-        return self.data[i]
+        if i < 0:
+            i += self.width
+        if i < 0 or i >= self.width:
+            raise IndexError('Grid index out of range')
+        return GridColumn(self, i)
 
     def __setitem__(self, key, item):
-        self.data[key] = item
+        column = self[key]
+        for y, value in enumerate(item):
+            column[y] = value
+
+    def __len__(self):
+        return self.width
 
     def __str__(self):
-        out = [[str(self.data[x][y])[0] for x in range(self.width)]
+        out = [[str(self.get(x, y))[0] for x in range(self.width)]
                for y in range(self.height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
@@ -205,41 +299,58 @@ class Grid:
     def __eq__(self, other):
         if other == None:
             return False
-        return self.data == other.data
+        return self.bits == other.bits and self.width == other.width and self.height == other.height
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        return hash(self.bits)
+
+    def get(self, x, y):
+        """
+        Returns the value at (x,y) without building a column view.
+        """
+        return (self.bits >> (x * self.height + y)) & 1 == 1
+
+    def set(self, x, y, value):
+        bit = 1 << (x * self.height + y)
+        if value:
+            self.bits |= bit
+        else:
+            self.bits &= ~bit
 
     def copy(self):
-        g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g = Grid.__new__(Grid)
+        g.width = self.width
+        g.height = self.height
+        g.bits = self.bits
         return g
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
-        return g
+        """
+        Bitboards are immutable values, so a shallow copy is just a copy.  Writes
+        to either grid are not seen by the other.
+        """
+        return self.copy()
 
     def count(self, item=True):
-        return sum([x.count(item) for x in self.data])
+        filled = self.bits.bit_count()
+        if item:
+            return filled
+        return self.width * self.height - filled
 
     def asList(self, key=True):
+        if key:
+            bits = self.bits
+        else:
+            bits = ~self.bits & ((1 << (self.width * self.height)) - 1)
+        height = self.height
         list = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self[x][y] == key:
-                    list.append((x, y))
+        while bits:
+            low = bits & -bits
+            list.append(divmod(low.bit_length() - 1, height))
+            bits ^= low
         return list
 
     def packBits(self):
@@ -252,8 +363,7 @@ class Grid:
         currentInt = 0
         for i in range(self.height * self.width):
             bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
+            if (self.bits >> i) & 1:
                 currentInt += 2 ** bit
             if (i + 1) % self.CELLS_PER_INT == 0:
                 bits.append(currentInt)
@@ -262,7 +372,7 @@ class Grid:
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -276,7 +386,7 @@ class Grid:
                 if cell == self.width * self.height:
                     break
                 x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
+                self.set(x, y, bit)
                 cell += 1
 
     def _unpackInt(self, packed, size):
@@ -293,12 +403,194 @@ class Grid:
         return bools
 
 
+class GridColumn:
+    """
+    A view of column x of a Grid, so that grid[x][y] reads and writes the
+    underlying bitboard.
+    """
+    __slots__ = ('grid', 'x')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.x = x
+
+    def __getitem__(self, y):
+        grid = self.grid
+        if y < 0:
+            y += grid.height
+        if y < 0 or y >= grid.height:
+            raise IndexError('Grid index out of range')
+        return (grid.bits >> (self.x * grid.height + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        grid = self.grid
+        if y < 0:
+            y += grid.height
+        if y < 0 or y >= grid.height:
+            raise IndexError('Grid index out of range')
+        grid.set(self.x, y, value)
+
+    def __len__(self):
+        return self.grid.height
+
+    def __iter__(self):
+        for y in range(self.grid.height):
+            yield self.grid.get(self.x, y)
+
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1, 2)):
         return bitRep
     width, height = bitRep[:2]
     return Grid(width, height, bitRepresentation=bitRep[2:])
 
+
+class DistanceField:
+    """
+    The maze distance from every cell of a board to the nearest of a set of
+    target cells, such as the pellets left, indexed like the bits of a Grid by
+    x * height + y.  Cells with no target in reach are UNREACHABLE.
+
+    Fields are immutable and a game's states share them: without() makes the
+    field that lacks one of the targets in O(1), and its distances are only
+    worked out when first asked for, from its parent's, by clearing the cells
+    whose nearest target was the one removed and filling them in again from
+    their neighbours.  Eating a pellet so costs a search of the few cells it
+    was nearest to rather than of the whole board, and Pacman's moves cost a
+    lookup.
+    """
+    __slots__ = ('neighbors', 'height', 'targets', 'distances', 'parent', 'removed')
+
+    UNREACHABLE = 0xFFFF
+
+    def __init__(self, layout, targets):
+        """
+        targets is a Grid or a list of positions.
+        """
+        self.neighbors = layout.getCellNeighbors()
+        self.height = layout.height
+        if isinstance(targets, Grid):
+            self.targets = targets.bits
+        else:
+            self.targets = 0
+            for x, y in targets:
+                self.targets |= 1 << (x * self.height + y)
+        self.distances = None
+        self.parent = None
+        self.removed = None
+
+    def without(self, pos):
+        """
+        Returns the field of the same targets but the one at pos.
+        """
+        x, y = pos
+        cell = x * self.height + y
+        if not (self.targets >> cell) & 1:
+            return self
+        field = DistanceField.__new__(DistanceField)
+        field.neighbors = self.neighbors
+        field.height = self.height
+        field.targets = self.targets & ~(1 << cell)
+        field.distances = None
+        field.parent = self
+        field.removed = cell
+        return field
+
+    def getDistance(self, pos):
+        """
+        The maze distance from pos to the nearest target, or inf if there is
+        none in reach.
+        """
+        x, y = pos
+        distance = self.getDistances()[int(x + 0.5) * self.height + int(y + 0.5)]
+        if distance == DistanceField.UNREACHABLE:
+            return float('inf')
+        return distance
+
+    def getDistances(self):
+        if self.distances == None:
+            # work down from the nearest ancestor that has its distances
+            lineage = []
+            field = self
+            while field.distances == None and field.parent != None:
+                lineage.append(field)
+                field = field.parent
+            if field.distances == None:
+                field.distances = field.search()
+            for child in reversed(lineage):
+                child.distances = child.removeTarget(field.distances)
+                child.parent = None
+                field = child
+        return self.distances
+
+    def search(self):
+        """
+        Finds the distances with a breadth-first search from all the targets.
+        """
+        neighbors = self.neighbors
+        distances = array('H', [DistanceField.UNREACHABLE]) * len(neighbors)
+        frontier = []
+        targets = self.targets
+        while targets:
+            lowest = targets & -targets
+            cell = lowest.bit_length() - 1
+            distances[cell] = 0
+            frontier.append(cell)
+            targets ^= lowest
+        distance = 0
+        while frontier:
+            distance += 1
+            nextFrontier = []
+            for cell in frontier:
+                for next in neighbors[cell]:
+                    if distances[next] == DistanceField.UNREACHABLE:
+                        distances[next] = distance
+                        nextFrontier.append(next)
+            frontier = nextFrontier
+        return distances
+
+    def removeTarget(self, parentDistances):
+        """
+        Derives the distances from those of the parent, which also had the
+        target self.removed.
+        """
+        unreachable = DistanceField.UNREACHABLE
+        neighbors = self.neighbors
+        distances = parentDistances[:]
+
+        # The cells that were measured to the removed target are those reached
+        # from it by steps that each add one to the parent's distance.
+        region = [self.removed]
+        distances[self.removed] = unreachable
+        for cell in region:
+            distance = parentDistances[cell] + 1
+            for next in neighbors[cell]:
+                if parentDistances[next] == distance and distances[next] != unreachable:
+                    distances[next] = unreachable
+                    region.append(next)
+
+        # Fill them in again from the cells around them, nearest first
+        queue = []
+        for cell in region:
+            best = unreachable
+            for next in neighbors[cell]:
+                if distances[next] + 1 < best:
+                    best = distances[next] + 1
+            if best < unreachable:
+                distances[cell] = best
+                queue.append((best, cell))
+        heapq.heapify(queue)
+        while queue:
+            distance, cell = heapq.heappop(queue)
+            if distance > distances[cell]:
+                continue
+            distance += 1
+            for next in neighbors[cell]:
+                if distance < distances[next]:
+                    distances[next] = distance
+                    heapq.heappush(queue, (distance, next))
+        return distances
+
 ####################################
 # Parts you shouldn't have to read #
 ####################################
@@ -317,21 +609,62 @@ class Actions:
 
     _directionsAsList = [('West', (-1, 0)), ('Stop', (0, 0)), ('East', (1, 0)), ('North', (0, 1)), ('South', (0, -1))]
 
+    # Tables indexed by direction code (see Directions.CODES)
+    _codeVectors = ((-1, 0), (0, 0), (1, 0), (0, 1), (0, -1))
+    _codeReverse = (2, 1, 0, 4, 3)
+    _codeBits = (1, 2, 4, 8, 16)
+
+    # The actions in each 5-bit mask of direction codes, as names and as codes
+    MASK_NAMES = tuple(tuple(Directions.NAMES[code] for code in range(5) if (mask >> code) & 1)
+                       for mask in range(32))
+    MASK_CODES = tuple(tuple(code for code in range(5) if (mask >> code) & 1)
+                       for mask in range(32))
+
+    # Full-speed and half-speed move vectors
+    _vectorDirections = dict([(vec, dir) for dir, vec in _directionsAsList] +
+                             [((dx * 0.5, dy * 0.5), dir) for dir, (dx, dy) in _directionsAsList])
+
     TOLERANCE = .001
 
     def reverseDirection(action):
-        if action == Directions.NORTH:
-            return Directions.SOUTH
-        if action == Directions.SOUTH:
-            return Directions.NORTH
-        if action == Directions.EAST:
-            return Directions.WEST
-        if action == Directions.WEST:
-            return Directions.EAST
-        return action
+        return Directions.REVERSE.get(action, action)
     reverseDirection = staticmethod(reverseDirection)
 
+    def reverseCode(code):
+        return Actions._codeReverse[code]
+    reverseCode = staticmethod(reverseCode)
+
+    def toCode(action):
+        """
+        Returns the direction code of an action given by name or by code.
+        Anything else is returned unchanged, and isLegal rejects it.
+        """
+        return Directions.CODES.get(action, action)
+    toCode = staticmethod(toCode)
+
+    def toMask(actions):
+        """
+        Returns the mask of direction codes of a list of action names.
+        """
+        mask = 0
+        for action in actions:
+            mask |= Actions._codeBits[Directions.CODES[action]]
+        return mask
+    toMask = staticmethod(toMask)
+
+    def isLegal(code, mask):
+        return code.__class__ is int and 0 <= code < 5 and (mask >> code) & 1 == 1
+    isLegal = staticmethod(isLegal)
+
+    def codeToVector(code, speed=1.0):
+        dx, dy = Actions._codeVectors[code]
+        return (dx * speed, dy * speed)
+    codeToVector = staticmethod(codeToVector)
+
     def vectorToDirection(vector):
+        direction = Actions._vectorDirections.get(vector)
+        if direction != None:
+            return direction
         dx, dy = vector
         if dy > 0:
             return Directions.NORTH
@@ -398,14 +731,23 @@ class GameStateData:
     def __init__(self, prevState=None):
         """
         Generates a new data packet by copying information from its predecessor.
+
+        The food grid, the capsule list, their DistanceFields and the
+        (immutable) AgentStates are shared with the predecessor: rules replace
+        food and capsules instead of editing them, and put changed agents in
+        with setAgentState().
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates(prevState.agentStates)
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.foodField = prevState.foodField
+            self.capsuleField = prevState.capsuleField
+            self.agentStates = prevState.agentStates[:]
+            self._changedAgents = 0
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._key = prevState._key
 
         self._foodEaten = None
         self._foodAdded = None
@@ -418,6 +760,8 @@ class GameStateData:
     def deepCopy(self):
         state = GameStateData(self)
         state.food = self.food.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates(self.agentStates)
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
@@ -425,12 +769,57 @@ class GameStateData:
         state._capsuleEaten = self._capsuleEaten
         return state
 
+    def pack(self):
+        """
+        Returns the parts of the state that change during a game as a tuple of
+        plain values, which is cheap to send to another process that has the
+        layout.  unpack() rebuilds the state.
+        """
+        agents = tuple((s.start.pos, s.configuration.pos, s.configuration.direction,
+                        s.isPacman, s.scaredTimer, s.numCarrying, s.numReturned)
+                       for s in self.agentStates)
+        return (self.food.bits, tuple(self.capsules), agents, self.score,
+                self._win, self._lose, tuple(self._eaten))
+
+    def unpack(self, layout, packed):
+        """
+        Sets this state to one made by pack() for a game on layout.
+        """
+        bits, capsules, agents, score, win, lose, eaten = packed
+        Configuration.useLayout(layout)
+        self.food = Grid(layout.width, layout.height)
+        self.food.bits = bits
+        self.capsules = list(capsules)
+        self.layout = layout
+        self.foodField = DistanceField(layout, self.food)
+        self.capsuleField = DistanceField(layout, self.capsules)
+        self.score = score
+        self.scoreChange = 0
+        self._win = win
+        self._lose = lose
+        self.agentStates = [AgentState(Configuration(start, Directions.STOP), isPacman,
+                                       Configuration(pos, direction), scaredTimer,
+                                       numCarrying, numReturned)
+                            for start, pos, direction, isPacman, scaredTimer, numCarrying, numReturned
+                            in agents]
+        self._changedAgents = 0
+        self._eaten = list(eaten)
+        self.computeKey()
+
     def copyAgentStates(self, agentStates):
         copiedStates = []
         for agentState in agentStates:
             copiedStates.append(agentState.copy())
         return copiedStates
 
+    def setAgentState(self, agentIndex, agentState):
+        """
+        Replaces the AgentState of agentIndex, recording that it changed during
+        the current move (see updateKey).
+        """
+        self.agentStates[agentIndex] = agentState
+        self._changedAgents |= 1 << agentIndex
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -452,13 +841,43 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        return hash((self._key, self.score))
+
+    def getKey(self):
+        """
+        Returns the Zobrist key of the board: food, capsules and every agent's
+        position, direction and scared timer (but not the score).
+        """
+        return self._key
+
+    def computeKey(self):
+        """
+        Recomputes the Zobrist key from scratch.
+        """
+        self._key = self.layout.getZobristTable().stateKey(
+            self.food, self.capsules, self.agentStates)
+
+    def updateKey(self, prevKey, prevAgentStates):
+        """
+        Derives the Zobrist key from prevKey, the key of the state this one was
+        made from by a single move.  Only agents replaced with setAgentState
+        during the move can have changed, and prevAgentStates[index] is the
+        AgentState each had before it.
+        """
+        table = self.layout.getZobristTable()
+        key = prevKey
+        if self._foodEaten != None:
+            key ^= table.food(self._foodEaten)
+        if self._capsuleEaten != None:
+            key ^= table.capsule(self._capsuleEaten)
+        changed = self._changedAgents
+        while changed:
+            lowest = changed & -changed
+            index = lowest.bit_length() - 1
+            key ^= table.agent(index, prevAgentStates[index]) ^ \
+                table.agent(index, self.agentStates[index])
+            changed ^= lowest
+        self._key = key
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
@@ -518,10 +937,13 @@ class GameStateData:
         """
         Creates an initial game state from a layout array (see layout.py).
         """
+        Configuration.useLayout(layout)
         self.food = layout.food.copy()
         #self.capsules = []
         self.capsules = layout.capsules[:]
         self.layout = layout
+        self.foodField = DistanceField(layout, self.food)
+        self.capsuleField = DistanceField(layout, self.capsules)
         self.score = 0
         self.scoreChange = 0
 
@@ -535,7 +957,9 @@ class GameStateData:
                     numGhosts += 1
             self.agentStates.append(AgentState(
                 Configuration(pos, Directions.STOP), isPacman))
+        self._changedAgents = 0
         self._eaten = [False for a in self.agentStates]
+        self.computeKey()
 
 
 try:
@@ -545,6 +969,253 @@ except:
     _BOINC_ENABLED = False
 
 
+class SearchState:
+    """
+    A mutable GameState for depth-first search.  apply() plays a move in place
+    under exactly the rules of generateSuccessor and undo() takes back the most
+    recent one, so a search can walk a game tree on a single state:
+
+      state = SearchState(gameState)
+      for action in state.getLegalActions(agentIndex):
+          state.apply(agentIndex, action)
+          ...
+          state.undo()
+
+    SearchState(gameState) is an instance of both SearchState and the class of
+    gameState, so all the GameState accessors work on it and it plays the
+    rules of the game it came from.  It can be passed straight to an
+    evaluation function.  Use snapshot() to keep a copy of the current node.
+    Moves played with apply() are not counted in GameState.explored.
+    """
+    # The SearchState subclass of each GameState class
+    stateClasses = {}
+
+    def __new__(cls, gameState):
+        gameStateClass = getattr(gameState, 'gameStateClass', gameState.__class__)
+        if gameStateClass not in SearchState.stateClasses:
+            SearchState.stateClasses[gameStateClass] = type(
+                'SearchState', (SearchState, gameStateClass), {'gameStateClass': gameStateClass})
+        return object.__new__(SearchState.stateClasses[gameStateClass])
+
+    def __init__(self, gameState):
+        self.data = SearchStateData(gameState.data)
+        self.history = []
+
+    def apply(self, agentIndex, action):
+        """
+        Plays action for agentIndex on this state.
+        """
+        data = self.data
+        if data._win or data._lose:
+            raise Exception('Can\'t generate a successor of a terminal state.')
+        data.replaced = {}
+        self.history.append((data.replaced, data.food, data.capsules, data.foodField,
+                             data.capsuleField, data.score, data._eaten, data._key,
+                             data._agentMoved, data._foodEaten, data._capsuleEaten,
+                             data.scoreChange))
+        data._foodEaten = None
+        data._capsuleEaten = None
+        data.scoreChange = 0
+        data._changedAgents = 0
+        self.applyRules(agentIndex, action)
+        data.updateKey(data._key, data.replaced)
+
+    def undo(self):
+        """
+        Takes back the most recent move played with apply().
+        """
+        data = self.data
+        (replaced, data.food, data.capsules, data.foodField, data.capsuleField, data.score,
+         data._eaten, data._key, data._agentMoved, data._foodEaten, data._capsuleEaten,
+         data.scoreChange) = self.history.pop()
+        for index, agentState in replaced.items():
+            data.agentStates[index] = agentState
+        data._win = False
+        data._lose = False
+
+    def snapshot(self):
+        """
+        Returns an ordinary GameState equal to the current node.
+        """
+        state = self.gameStateClass()
+        state.data = GameStateData(self.data)
+        state.data._win = self.data._win
+        state.data._lose = self.data._lose
+        return state
+
+
+class SearchStateData(GameStateData):
+    """
+    The data of a SearchState.  The AgentStates that setAgentState replaces
+    during a move are kept in self.replaced, so that SearchState.undo() can
+    put them back.
+    """
+
+    def __init__(self, prevState):
+        GameStateData.__init__(self, prevState)
+        self._win = prevState._win
+        self._lose = prevState._lose
+        self.replaced = {}
+
+    def setAgentState(self, agentIndex, agentState):
+        if not (self._changedAgents >> agentIndex) & 1:
+            self.replaced[agentIndex] = self.agentStates[agentIndex]
+        GameStateData.setAgentState(self, agentIndex, agentState)
+
+
+# The constants of the classic rules, which pacman.py plays on GameStates
+# and RolloutSimulator on its compact states
+SCARED_TIME = 40    # Moves ghosts are scared
+COLLISION_TOLERANCE = 0.7  # How close ghosts must be to Pacman to kill
+TIME_PENALTY = 1  # Number of points lost each round
+GHOST_SPEED = 1.0
+
+class RolloutSimulator:
+    """
+    Plays the classic rules (PacmanRules and GhostRules) on a compact state,
+    for the many cheap playouts of Monte Carlo search.  A state is a flat list
+
+        [pacmanPosition, foodBits, capsules, score, outcome,
+         ghost 1 position, ghost 1 direction code, ghost 1 scared timer,
+         ghost 2 position, ...]
+
+    where foodBits are the bits of the food Grid, capsules is a tuple and
+    outcome is 0 while the game goes on, WIN or LOSE after; state[:] copies
+    it.  Scores and positions come out as the full rules would have them.
+    """
+    WIN = 1
+    LOSE = -1
+
+    def __init__(self, gameState):
+        layout = gameState.data.layout
+        self.height = layout.height
+        self.legalActions = layout.legalActions
+        self.legalGhostActions = layout.legalGhostActions
+        self.ghostStarts = [s.start.pos for s in gameState.data.agentStates[1:]]
+        self.numAgents = gameState.getNumAgents()
+
+    def getInitialState(self, gameState):
+        """
+        Returns the compact form of gameState.
+        """
+        data = gameState.data
+        outcome = 0
+        if data._win:
+            outcome = RolloutSimulator.WIN
+        elif data._lose:
+            outcome = RolloutSimulator.LOSE
+        # Pacman is always on a whole cell
+        x, y = data.agentStates[0].configuration.pos
+        state = [(int(x), int(y)), data.food.bits,
+                 tuple(data.capsules), data.score, outcome]
+        for ghostState in data.agentStates[1:]:
+            conf = ghostState.configuration
+            state += [conf.pos, conf.directionCode, ghostState.scaredTimer]
+        return state
+
+    def getLegalActionCodes(self, state, agentIndex):
+        if agentIndex == 0:
+            return Actions.MASK_CODES[self.legalActions[state[0]]]
+        base = 2 + 3 * agentIndex
+        pos = state[base]
+        direction = state[base + 1]
+        if pos[0] % 1 == 0 and pos[1] % 1 == 0:
+            return Actions.MASK_CODES[self.legalGhostActions[pos][direction]]
+        # scared ghosts between cells keep going
+        return (direction,)
+
+    def apply(self, state, agentIndex, code):
+        """
+        Plays the move with direction code of agentIndex on state, in place.
+        """
+        if agentIndex == 0:
+            x, y = state[0]
+            dx, dy = Actions._codeVectors[code]
+            pos = state[0] = (x + dx, y + dy)
+            bit = 1 << (pos[0] * self.height + pos[1])
+            if state[1] & bit:
+                state[1] ^= bit
+                state[3] += 10
+                if state[1] == 0:
+                    state[3] += 500
+                    state[4] = RolloutSimulator.WIN
+            if pos in state[2]:
+                state[2] = tuple(capsule for capsule in state[2] if capsule != pos)
+                for base in range(7, len(state), 3):
+                    state[base] = SCARED_TIME
+            state[3] -= TIME_PENALTY
+            for index in range(1, self.numAgents):
+                self.checkCollision(state, index)
+        else:
+            base = 2 + 3 * agentIndex
+            timer = state[base + 2]
+            speed = GHOST_SPEED
+            if timer > 0:
+                speed /= 2.0
+            x, y = state[base]
+            dx, dy = Actions._codeVectors[code]
+            pos = (x + dx * speed, y + dy * speed)
+            if timer > 0:
+                if timer == 1:
+                    pos = nearestPoint(pos)
+                state[base + 2] = timer - 1
+            state[base] = pos
+            state[base + 1] = code
+            self.checkCollision(state, agentIndex)
+
+    def checkCollision(self, state, agentIndex):
+        base = 2 + 3 * agentIndex
+        (gx, gy), (px, py) = state[base], state[0]
+        if abs(gx - px) + abs(gy - py) > COLLISION_TOLERANCE:
+            return
+        if state[base + 2] > 0:
+            state[3] += 200
+            state[base] = self.ghostStarts[agentIndex - 1]
+            state[base + 1] = Directions.CODES[Directions.STOP]
+            state[base + 2] = 0
+        elif state[4] != RolloutSimulator.WIN:
+            state[3] -= 500
+            state[4] = RolloutSimulator.LOSE
+
+    def randomGhostAction(self, state, agentIndex, rand):
+        """
+        Returns the move of a RandomGhost, drawn with the random.Random rand.
+        """
+        legal = self.getLegalActionCodes(state, agentIndex)
+        return legal[int(rand.random() * len(legal))]
+
+    def directionalGhostAction(self, state, agentIndex, rand, probAttack=0.8, probScaredFlee=0.8):
+        """
+        Returns the move of a DirectionalGhost, drawn with the random.Random
+        rand: with probability probAttack (probScaredFlee when scared) one of
+        the moves that get closest to (furthest from) Pacman, and otherwise
+        any legal move.
+        """
+        legal = self.getLegalActionCodes(state, agentIndex)
+        if len(legal) == 1:
+            return legal[0]
+        base = 2 + 3 * agentIndex
+        scared = state[base + 2] > 0
+        if rand.random() >= (probScaredFlee if scared else probAttack):
+            return legal[int(rand.random() * len(legal))]
+        speed = 0.5 if scared else 1
+        x, y = state[base]
+        px, py = state[0]
+        bestActions = []
+        best = None
+        for code in legal:
+            dx, dy = Actions._codeVectors[code]
+            distance = abs(x + dx * speed - px) + abs(y + dy * speed - py)
+            if scared:
+                distance = -distance
+            if best == None or distance < best:
+                best = distance
+                bestActions = [code]
+            elif distance == best:
+                bestActions.append(code)
+        return bestActions[int(rand.random() * len(bestActions))]
+
+
 class Game:
     """
     The Game manages the control flow, soliciting actions from agents.
@@ -620,6 +1291,10 @@ class Game:
                 self.unmute()
                 self._agentCrash(i, quiet=True)
                 return
+            if ("setMoveTimeLimit" in dir(agent)):
+                agent.setMoveTimeLimit(min(self.rules.getMoveTimeout(i),
+                                           self.rules.getMoveWarningTime(i)),
+                                       self.rules.getMaxTotalTime(i))
             if ("registerInitialState" in dir(agent)):
                 self.mute(i)
                 if self.catchExceptions:
@@ -16,9 +16,22 @@ from util import manhattanDistance
 from game import Grid
 import os
 import random
+import hashlib
+import sys
+from array import array
+from collections import deque
 from functools import reduce
 
 VISIBILITY_MATRIX_CACHE = {}
+ZOBRIST_TABLE_CACHE = {}
+LEGAL_ACTIONS_CACHE = {}
+MAZE_DISTANCES_CACHE = {}
+CELL_NEIGHBORS_CACHE = {}
+CONFIGURATION_TABLE_CACHE = {}
+
+# Where all-pairs maze distances are saved between runs
+MAZE_DISTANCES_DIR = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '.mazeDistances')
 
 
 class Layout:
@@ -37,11 +50,118 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
+        self.zobristTable = None
+        self.mazeDistances = None
+        self.cellNeighbors = None
+        self.initializeLegalActions()
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
         return self.numGhosts
 
+    def getZobristTable(self):
+        """
+        Returns the ZobristTable for this board, shared by every layout built
+        from the same text.
+        """
+        if self.zobristTable == None:
+            text = "\n".join(self.layoutText)
+            if text not in ZOBRIST_TABLE_CACHE:
+                ZOBRIST_TABLE_CACHE[text] = ZobristTable(text)
+            self.zobristTable = ZOBRIST_TABLE_CACHE[text]
+        return self.zobristTable
+
+    def getConfigurationTable(self):
+        """
+        Returns the dict that game.Configuration interns the configurations of
+        games on this board in, shared by every layout built from the same
+        text.
+        """
+        text = "\n".join(self.layoutText)
+        if text not in CONFIGURATION_TABLE_CACHE:
+            CONFIGURATION_TABLE_CACHE[text] = {}
+        return CONFIGURATION_TABLE_CACHE[text]
+
+    def getMazeDistances(self):
+        """
+        Returns the MazeDistances for this board.  They are computed on first
+        use, then shared by every layout with the same text and saved to
+        MAZE_DISTANCES_DIR for later runs.
+        """
+        if self.mazeDistances == None:
+            text = "\n".join(self.layoutText)
+            if text not in MAZE_DISTANCES_CACHE:
+                MAZE_DISTANCES_CACHE[text] = MazeDistances(self.walls, text)
+            self.mazeDistances = MAZE_DISTANCES_CACHE[text]
+        return self.mazeDistances
+
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the number of moves on the shortest path between two positions,
+        or infinity if no path exists.  Positions between cells are rounded to
+        the nearest cell.
+        """
+        return self.getMazeDistances().getDistance(pos1, pos2)
+
+    def getCellNeighbors(self):
+        """
+        Returns, for every cell numbered like the bits of a Grid by
+        x * height + y, the tuple of the open cells next to it (none for
+        walls).
+        """
+        if self.cellNeighbors == None:
+            text = "\n".join(self.layoutText)
+            if text not in CELL_NEIGHBORS_CACHE:
+                neighbors = []
+                for x in range(self.width):
+                    for y in range(self.height):
+                        if self.walls[x][y]:
+                            neighbors.append(())
+                            continue
+                        neighbors.append(tuple(nx * self.height + ny
+                                               for nx, ny in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+                                               if 0 <= nx < self.width and 0 <= ny < self.height
+                                               and not self.walls[nx][ny]))
+                CELL_NEIGHBORS_CACHE[text] = tuple(neighbors)
+            self.cellNeighbors = CELL_NEIGHBORS_CACHE[text]
+        return self.cellNeighbors
+
+    def initializeLegalActions(self):
+        """
+        Tabulates the legal moves from every open cell, since walls never
+        change: self.legalActions[pos] holds the mask of Pacman's direction
+        codes and self.legalGhostActions[pos][code] a ghost's mask given the
+        code of the direction it is travelling in.  Only whole-cell positions
+        are listed; the rules fall back to Actions.getPossibleActions for the
+        others.
+        """
+        text = "\n".join(self.layoutText)
+        if text not in LEGAL_ACTIONS_CACHE:
+            from game import Actions, Configuration, Directions
+            legalActions = {}
+            legalGhostActions = {}
+            # probe with configurations interned in this board's own table
+            interned = Configuration._interned
+            Configuration.useLayout(self)
+            for x in range(1, self.width - 1):
+                for y in range(1, self.height - 1):
+                    if self.walls[x][y]:
+                        continue
+                    possible = Actions.getPossibleActions(
+                        Configuration((x, y), Directions.STOP), self.walls)
+                    legalActions[(x, y)] = Actions.toMask(possible)
+                    ghostActions = []
+                    for heading in Directions.NAMES:
+                        actions = [a for a in possible if a != Directions.STOP]
+                        reverse = Actions.reverseDirection(heading)
+                        if reverse in actions and len(actions) > 1:
+                            actions.remove(reverse)
+                        ghostActions.append(Actions.toMask(actions))
+                    legalGhostActions[(x, y)] = tuple(ghostActions)
+            Configuration._interned = interned
+            LEGAL_ACTIONS_CACHE[text] = (legalActions, legalGhostActions)
+        self.legalActions, self.legalGhostActions = LEGAL_ACTIONS_CACHE[text]
+
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
         if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
@@ -137,6 +257,157 @@ class Layout:
             self.numGhosts += 1
 
 
+class ZobristTable:
+    """
+    Random 64-bit keys for the features of a game state on one board: food and
+    capsules per cell, and per agent its position, direction and scared timer.
+    The key of a state is the XOR of the keys of its features, so a successor's
+    key follows from its parent's by XOR-ing out the features that changed and
+    XOR-ing in their replacements.
+
+    Keys are derived from the layout text rather than drawn from the global
+    random module, so they are the same in every process and never disturb
+    the seeded games.
+    """
+
+    def __init__(self, layoutText):
+        self.salt = hashlib.blake2b(layoutText.encode(), digest_size=16).digest()
+        self.foodKeys = {}
+        self.capsuleKeys = {}
+        self.agentKeys = {}
+
+    def _newKey(self, feature):
+        digest = hashlib.blake2b(repr(feature).encode(), digest_size=8, salt=self.salt)
+        return int.from_bytes(digest.digest(), 'little')
+
+    def _positionFeature(self, pos):
+        # Half-step positions of scared ghosts get their own keys, and 3 and 3.0
+        # must share one.
+        x, y = pos
+        return (int(round(x * 2)), int(round(y * 2)))
+
+    def food(self, pos):
+        key = self.foodKeys.get(pos)
+        if key == None:
+            key = self._newKey(('food', self._positionFeature(pos)))
+            self.foodKeys[pos] = key
+        return key
+
+    def capsule(self, pos):
+        key = self.capsuleKeys.get(pos)
+        if key == None:
+            key = self._newKey(('capsule', self._positionFeature(pos)))
+            self.capsuleKeys[pos] = key
+        return key
+
+    def agent(self, agentIndex, agentState):
+        """
+        Returns the key of an agent's position, direction and scared timer.
+        """
+        conf = agentState.configuration
+        feature = (agentIndex, conf, agentState.scaredTimer)
+        key = self.agentKeys.get(feature)
+        if key == None:
+            key = (self._newKey(('position', agentIndex, self._positionFeature(conf.pos))) ^
+                   self._newKey(('direction', agentIndex, conf.direction)) ^
+                   self._newKey(('scared', agentIndex, agentState.scaredTimer)))
+            self.agentKeys[feature] = key
+        return key
+
+    def stateKey(self, food, capsules, agentStates):
+        """
+        Computes the key of a whole state from scratch.
+        """
+        key = 0
+        for pos in food.asList():
+            key ^= self.food(pos)
+        for pos in capsules:
+            key ^= self.capsule(pos)
+        for agentIndex, agentState in enumerate(agentStates):
+            key ^= self.agent(agentIndex, agentState)
+        return key
+
+
+class MazeDistances:
+    """
+    The length of the shortest path between every pair of open cells of a
+    board, found by a breadth-first search from each cell and stored in a
+    flat uint16 array: the distance from cell i to cell j (numbered in
+    self.cellIndex) is distances[i * numCells + j].
+    """
+    UNREACHABLE = 0xFFFF
+
+    def __init__(self, walls, layoutText):
+        self.cellIndex = {}
+        for x in range(walls.width):
+            for y in range(walls.height):
+                if not walls[x][y]:
+                    self.cellIndex[(x, y)] = len(self.cellIndex)
+        self.numCells = len(self.cellIndex)
+        self.fileName = os.path.join(MAZE_DISTANCES_DIR, hashlib.blake2b(
+            layoutText.encode(), digest_size=16).hexdigest() + '.dist')
+        self.distances = self.load()
+        if self.distances == None:
+            self.distances = self.compute(walls)
+            self.save()
+
+    def compute(self, walls):
+        n = self.numCells
+        neighbors = [None] * n
+        for (x, y), i in self.cellIndex.items():
+            neighbors[i] = [self.cellIndex[p] for p in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+                            if p in self.cellIndex]
+        distances = array('H', [MazeDistances.UNREACHABLE]) * (n * n)
+        for source in range(n):
+            row = source * n
+            distances[row + source] = 0
+            fringe = deque([source])
+            while fringe:
+                cell = fringe.popleft()
+                dist = distances[row + cell] + 1
+                for next in neighbors[cell]:
+                    if distances[row + next] == MazeDistances.UNREACHABLE:
+                        distances[row + next] = dist
+                        fringe.append(next)
+        return distances
+
+    def load(self):
+        distances = array('H')
+        try:
+            with open(self.fileName, 'rb') as f:
+                distances.fromfile(f, self.numCells * self.numCells)
+        except (OSError, EOFError):
+            return None
+        if sys.byteorder == 'big':
+            distances.byteswap()
+        return distances
+
+    def save(self):
+        distances = array('H', self.distances)
+        if sys.byteorder == 'big':
+            distances.byteswap()
+        # Write then rename, so that concurrent runs never read half a file
+        tmpName = '%s.%d.tmp' % (self.fileName, os.getpid())
+        try:
+            if not os.path.isdir(MAZE_DISTANCES_DIR):
+                os.makedirs(MAZE_DISTANCES_DIR)
+            with open(tmpName, 'wb') as f:
+                distances.tofile(f)
+            os.replace(tmpName, self.fileName)
+        except OSError:
+            pass  # The cache is only an optimization
+
+    def getDistance(self, pos1, pos2):
+        x1, y1 = pos1
+        x2, y2 = pos2
+        i = self.cellIndex[(int(x1 + 0.5), int(y1 + 0.5))]
+        j = self.cellIndex[(int(x2 + 0.5), int(y2 + 0.5))]
+        dist = self.distances[i * self.numCells + j]
+        if dist == MazeDistances.UNREACHABLE:
+            return float('inf')
+        return dist
+
+
 def getLayout(name, back=2):
     if name.endswith('.lay'):
         layout = tryToLoad('layouts/' + name)
@@ -13,10 +13,18 @@
 
 
 from util import manhattanDistance
-from game import Directions
-import random, util
+from game import Directions, Actions
+import random, util, time, math, json
+import multiprocessing
 
-from game import Agent
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from game import Agent, SearchState, RolloutSimulator
+from ghostAgents import DirectionalGhost
+from features import LeafBatch, LinearEvaluation, specEvaluation
 
 class ReflexAgent(Agent):
     """
@@ -39,10 +47,11 @@ class ReflexAgent(Agent):
         some Directions.X for some X in the set {NORTH, SOUTH, WEST, EAST, STOP}
         """
         # Collect legal moves and successor states
-        legalMoves = gameState.getLegalActions()
+        successors = gameState.generateSuccessors(0)
+        legalMoves = [action for action, successorGameState in successors]
 
         # Choose one of the best actions
-        scores = [self.evaluationFunction(gameState, action) for action in legalMoves]
+        scores = [self.evaluateSuccessor(successorGameState) for action, successorGameState in successors]
         bestScore = max(scores)
         bestIndices = [index for index in range(len(scores)) if scores[index] == bestScore]
         chosenIndex = random.choice(bestIndices) # Pick randomly among the best
@@ -71,6 +80,14 @@ class ReflexAgent(Agent):
         successorGameState = currentGameState.generatePacmanSuccessor(action)  # current game state
         #print("successorGameState: ", successorGameState)
 
+        return self.evaluateSuccessor(successorGameState)
+
+    def evaluateSuccessor(self, successorGameState):
+        """
+        Scores the state reached by a proposed action.  getAction calls this
+        directly on the successors from generateSuccessors, so they are not
+        generated a second time.
+        """
         newPos = successorGameState.getPacmanPosition()  # pacman position in the maze
         #print("newPos: ", newPos)
 
@@ -121,6 +138,64 @@ def scoreEvaluationFunction(currentGameState):
     """
     return currentGameState.getScore()
 
+def scoreValueBounds(gameState, depth):
+    """
+    Bounds on the score after depth rounds of moves from gameState: each
+    round costs Pacman 1 and gains him at most a pellet and every ghost, and
+    the game ends once, in a win or a loss.  A loss costs 500 for each ghost
+    Pacman runs into, and he can run into all of them in the same move.
+    """
+    score = gameState.getScore()
+    numGhosts = gameState.getNumAgents() - 1
+    return score - depth - 500 * numGhosts, score + depth * (10 + 200 * numGhosts) + 500
+scoreEvaluationFunction.valueBounds = scoreValueBounds
+
+def scoreBatchEvaluation(batch):
+    return batch.scores
+scoreEvaluationFunction.batchEvaluate = scoreBatchEvaluation
+
+class SearchStats:
+    """
+    What a search did for one move: the nodes it visited at each ply (the
+    root is ply 0), evaluation function calls and evaluations taken from a
+    kept SearchNode, alpha-beta cutoffs, subtrees skipped by bounded
+    expectimax, the depth, nodes and seconds of each iteration of iterative
+    deepening, and Monte Carlo playouts.  MCTSAgent counts the tree nodes
+    its playouts pass through, by round of Pacman's moves rather than ply.
+    """
+
+    def __init__(self):
+        self.plyNodes = []
+        self.evaluations = 0
+        self.cachedEvaluations = 0
+        self.cutoffs = 0
+        self.pruned = 0
+        self.iterations = []
+        self.playouts = 0
+
+    def countNode(self, ply):
+        plyNodes = self.plyNodes
+        while len(plyNodes) <= ply:
+            plyNodes.append(0)
+        plyNodes[ply] += 1
+
+    def getNodes(self):
+        return sum(self.plyNodes)
+
+    def merge(self, other):
+        """
+        Adds the counts of other, e.g. from a worker process, to these.
+        """
+        while len(self.plyNodes) < len(other.plyNodes):
+            self.plyNodes.append(0)
+        for ply, count in enumerate(other.plyNodes):
+            self.plyNodes[ply] += count
+        self.evaluations += other.evaluations
+        self.cachedEvaluations += other.cachedEvaluations
+        self.cutoffs += other.cutoffs
+        self.pruned += other.pruned
+        self.playouts += other.playouts
+
 class MultiAgentSearchAgent(Agent):
     """
     This class provides some common elements to all of your
@@ -136,10 +211,495 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', makeUnmake = 'False',
+                 transpositionTable = '0', replacement = 'lru', workers = '0', treeReuse = 'False',
+                 moveTime = '0', timeFraction = '0.1', batchEval = 'False', evalCache = '0',
+                 **weights):
         self.index = 0 # Pacman is always agent index 0
-        self.evaluationFunction = util.lookup(evalFn, globals())
+        # evalFn=spec:path is the LinearEvaluation of a spec file (see
+        # features.py); the weights of its features may also be given as
+        # arguments, with or without a file
+        if evalFn == 'spec' or evalFn.startswith('spec:'):
+            self.evaluationFunction = specEvaluation(evalFn[len('spec:'):], weights)
+        elif weights:
+            raise Exception('Unknown agent arguments: ' + ', '.join(sorted(weights)))
+        else:
+            self.evaluationFunction = util.lookup(evalFn, globals())
+        # With evalCache > 0 evaluations are memoized in an LRU of that many
+        # positions, kept across moves
+        self.evaluationCache = None
+        if int(evalCache) > 0:
+            self.evaluationCache = util.EvaluationCache(self.evaluationFunction, int(evalCache))
+            self.evaluationFunction = self.evaluationCache
         self.depth = int(depth)
+        self.makeUnmake = util.parseBoolean(makeUnmake)
+        # A table of transpositionTable entries, kept across moves; 0 turns it off
+        self.transpositionTable = None
+        if int(transpositionTable) > 0:
+            self.transpositionTable = util.TranspositionTable(int(transpositionTable), replacement)
+        # With workers > 0 the root actions are searched in a pool of processes
+        self.workers = int(workers)
+        self.pool = None
+        self.poolLayoutText = None
+        self.sharedAlpha = None
+        # With treeReuse the search tree is kept from one move to the next
+        self.treeReuse = util.parseBoolean(treeReuse)
+        self.tree = None
+        # The time budget of searches that run against the clock
+        self.moveTime = float(moveTime)
+        self.timeFraction = float(timeFraction)
+        self.moveTimeLimit = None
+        self.gameTimeLimit = None
+        self.gameTimeUsed = 0
+        # Per-move statistics, only collected after setSearchStats
+        self.collectStats = False
+        self.statsFile = None
+        self.searchStats = None
+        self.searchStatsLog = []
+        self.gameNumber = 0
+        self.moveNumber = 0
+        # Nodes searched and subtrees pruned in the current move
+        self.nodeCount = 0
+        self.prunedNodes = 0
+        # With batchEval on, the leaves of each last round of moves are scored
+        # together by the evaluation function's batchEvaluate.  Only functions
+        # defined by their features or the score have one (LinearEvaluations
+        # and scoreEvaluationFunction); the leaves of any other are still
+        # evaluated one at a time, so there is a single definition to edit.
+        self.batchEvaluate = None
+        if util.parseBoolean(batchEval):
+            if numpy == None:
+                raise Exception('batchEval needs NumPy')
+            self.batchEvaluate = getattr(self.evaluationFunction, 'batchEvaluate', None)
+
+    def registerInitialState(self, gameState):
+        self.gameNumber += 1
+        self.moveNumber = 0
+        self.gameTimeUsed = 0
+
+    def setSearchStats(self, statsFile=None):
+        """
+        Turns on the collection of search statistics (see SearchStats).  The
+        record of each move is added to searchStatsLog and, if statsFile is
+        given, written to it as one line of JSON.
+        """
+        self.collectStats = True
+        self.statsFile = statsFile
+
+    def beginMove(self):
+        """
+        Called by getAction before it searches.  Resets the counts of the move
+        and starts its statistics.
+        """
+        self.moveNumber += 1
+        self.nodeCount = 0
+        self.prunedNodes = 0
+        self.moveStart = time.time()
+        if not self.collectStats:
+            return
+        self.searchStats = SearchStats()
+        if self.transpositionTable != None:
+            self.tableStart = self.transpositionTable.getStats()
+        if self.evaluationCache != None:
+            self.cacheStart = self.evaluationCache.getStats()
+
+    def endMove(self, gameState, depth=None):
+        """
+        Called by getAction once it has chosen its move, after depth rounds
+        of search (self.depth by default).  Records the move's statistics.
+        """
+        seconds = time.time() - self.moveStart
+        self.gameTimeUsed += seconds
+        if not self.collectStats:
+            return
+        stats = self.searchStats
+        depth = self.depth if depth == None else depth
+        nodes = stats.getNodes()
+        plies = depth * gameState.getNumAgents()
+        record = {'game': self.gameNumber, 'move': self.moveNumber,
+                  'agent': self.__class__.__name__, 'depth': depth,
+                  'seconds': seconds, 'nodes': nodes,
+                  'nodesPerSecond': nodes / seconds if seconds > 0 else 0,
+                  'plyNodes': stats.plyNodes,
+                  # the b for which b ** plies == nodes, as in printNodeCount
+                  'branchingFactor': nodes ** (1.0 / plies) if plies > 0 and nodes > 0 else 0,
+                  'evaluations': stats.evaluations,
+                  'cachedEvaluations': stats.cachedEvaluations,
+                  'cutoffs': stats.cutoffs, 'pruned': stats.pruned,
+                  'iterations': stats.iterations, 'playouts': stats.playouts}
+        if self.transpositionTable != None:
+            table = self.transpositionTable.getStats()
+            hits = table['hits'] - self.tableStart['hits']
+            misses = table['misses'] - self.tableStart['misses']
+            record['table'] = {'hits': hits, 'misses': misses,
+                               'evictions': table['evictions'] - self.tableStart['evictions'],
+                               'entries': table['entries'],
+                               'hitRate': hits / float(hits + misses) if hits + misses > 0 else 0}
+        if self.evaluationCache != None:
+            cache = self.evaluationCache.getStats()
+            hits = cache['hits'] - self.cacheStart['hits']
+            misses = cache['misses'] - self.cacheStart['misses']
+            record['evalCache'] = {'hits': hits, 'misses': misses,
+                                   'evictions': cache['evictions'] - self.cacheStart['evictions'],
+                                   'entries': cache['entries'],
+                                   'hitRate': hits / float(hits + misses) if hits + misses > 0 else 0}
+        self.searchStatsLog.append(record)
+        if self.statsFile != None:
+            self.statsFile.write(json.dumps(record) + '\n')
+            self.statsFile.flush()
+
+    def setMoveTimeLimit(self, seconds, totalSeconds=None):
+        """
+        Called by the game with the time the rules allow for one move and, if
+        they limit it, for all of this agent's moves in the game.
+        """
+        self.moveTimeLimit = seconds
+        self.gameTimeLimit = totalSeconds
+
+    def getMoveBudget(self):
+        """
+        Returns the seconds a timed search may spend on a move: moveTime if
+        given, otherwise timeFraction of the rules' limit, or None outside a
+        game.  In a game with a total limit it is never more than
+        timeFraction of what is left of half that limit.
+        """
+        budget = None
+        if self.moveTime > 0:
+            budget = self.moveTime
+        elif self.moveTimeLimit != None:
+            budget = self.moveTimeLimit * self.timeFraction
+        if budget != None and self.gameTimeLimit != None:
+            # half of the game's time is held back for what a budget cannot
+            # stop, like the first round of iterative deepening
+            timeLeft = max(0, self.gameTimeLimit / 2.0 - self.gameTimeUsed)
+            budget = min(budget, timeLeft * self.timeFraction)
+        return budget
+
+    def __getstate__(self):
+        # the pool and the search tree stay with the process that made them
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['sharedAlpha'] = None
+        state['tree'] = None
+        state['statsFile'] = None
+        return state
+
+    def final(self, gameState):
+        """
+        Called by the game once it is over.
+        """
+        self.close()
+
+    def close(self):
+        """
+        Stops the pool of worker processes, if there is one.  A later
+        parallel search starts a new one.
+        """
+        if self.pool != None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.sharedAlpha = None
+
+    def getPool(self, gameState):
+        """
+        Returns the pool of worker processes, started for the layout of
+        gameState.  Each worker keeps its own copy of the layout and of this
+        agent, so a search task only has to carry the state.
+        """
+        layout = gameState.data.layout
+        if self.pool != None and self.poolLayoutText != layout.layoutText:
+            self.close()
+        if self.pool == None:
+            self.sharedAlpha = multiprocessing.Value('d', float('-inf'), lock=False)
+            self.pool = multiprocessing.Pool(self.workers, initializer=initSearchWorker,
+                                             initargs=(layout, gameState.__class__, self, self.sharedAlpha))
+            self.poolLayoutText = layout.layoutText
+        return self.pool
+
+    def parallelSearch(self, gameState, first=None, shareAlpha=False, **searchArgs):
+        """
+        Searches each root action in its own worker task, by calling
+        searchRoot(state, actions=[action], **searchArgs) in the worker, and
+        returns the best action; of equal values the first in the order of
+        the legal actions (with first in front) wins, as in a serial search.
+
+        With shareAlpha, each task also passes searchRoot the best root value
+        found so far as its alpha, so subtrees started after a good one has
+        finished still get pruned.  A subtree cut off that way reports a
+        value below that alpha, so it can never be picked over the one that
+        set it.
+        """
+        pool = self.getPool(gameState)
+        actions = self.orderActions(gameState.getLegalActionCodes(0), first)
+        packed = gameState.pack()
+        self.sharedAlpha.value = float('-inf')
+
+        def publish(result):
+            if result[1] > self.sharedAlpha.value:
+                self.sharedAlpha.value = result[1]
+
+        tasks = [pool.apply_async(searchWorkerTask, (packed, action, searchArgs, shareAlpha),
+                                  callback=publish)
+                 for action in actions]
+
+        bestAction = Directions.WEST
+        maximum = float("-inf")
+        self.horizonReached = False
+        for task in tasks:
+            action, value, nodeCount, horizonReached, stats, prunedNodes = task.get()
+            self.nodeCount += nodeCount
+            self.prunedNodes += prunedNodes
+            if stats != None:
+                self.searchStats.merge(stats)
+            self.horizonReached = self.horizonReached or horizonReached
+            if value > maximum:
+                maximum = value
+                bestAction = action
+        return bestAction
+
+    def getSearchRoot(self, gameState):
+        """
+        Returns the state a search starts from.  With treeReuse on this is the
+        SearchNode for gameState, taken from the tree of the last search if it
+        reached gameState (see findInTree).  With makeUnmake on it is a
+        SearchState, which successors() plays moves on in place instead of
+        allocating a new state per node.
+        """
+        if self.treeReuse and hasattr(gameState, 'data'):
+            root = self.findInTree(gameState)
+            if root == None:
+                root = SearchNode(gameState)
+            self.tree = root
+            return root
+        if self.makeUnmake and hasattr(gameState, 'data'):
+            return SearchState(gameState)
+        return gameState
+
+    def findInTree(self, gameState):
+        """
+        Returns the node of the kept tree for gameState, or None: the root
+        itself, when a move searches the same state again (as each iteration
+        of iterative deepening does), or a node one round of moves (Pacman's
+        and then each ghost's) below it.  Everything else in the old tree is
+        dropped.
+        """
+        if self.tree == None:
+            return None
+        key = gameState.data.getKey()
+        if self.tree.state.data.getKey() == key and self.tree.state == gameState:
+            return self.tree
+        nodes = [self.tree]
+        for agentIndex in range(gameState.getNumAgents()):
+            nodes = [child for node in nodes for child in node.children.values()]
+        for node in nodes:
+            if node.state.data.getKey() == key and node.state == gameState:
+                return node
+        return None
+
+    def evaluate(self, gameState):
+        """
+        Returns the evaluation of a search leaf, computed once per SearchNode.
+        """
+        stats = self.searchStats
+        if isinstance(gameState, SearchNode):
+            if gameState.evaluation == None:
+                gameState.evaluation = self.evaluationFunction(gameState.state)
+                if stats != None:
+                    stats.evaluations += 1
+            elif stats != None:
+                stats.cachedEvaluations += 1
+            return gameState.evaluation
+        if stats != None:
+            stats.evaluations += 1
+        return self.evaluationFunction(gameState)
+
+    def batchesLastRound(self, gameState, depth):
+        """
+        Returns whether a node depth rounds into the search is to be valued
+        by evaluateLastRound.
+        """
+        return self.batchEvaluate != None and depth == self.depth - 1 and hasattr(gameState, 'data')
+
+    def evaluateLastRound(self, gameState, agentIndex, combine, distribution=None):
+        """
+        Returns the value of gameState, a node in the last round of moves of a
+        search.  Every leaf below it is collected into one LeafBatch and
+        scored by a single batchEvaluate call; combine(agentIndex, values,
+        weights) then backs the values up to the nodes where agentIndex moves.
+        weights are the probabilities of the ghosts' moves given by
+        distribution(gameState, agentIndex), or None if it is not given or
+        returns None.
+        """
+        numAgents = gameState.getNumAgents()
+        batch = LeafBatch(gameState.data.layout)
+        leaves = []
+        stats = self.searchStats
+        firstPly = (self.depth - 1) * numAgents
+
+        def collect(agentIndex, gameState):
+            # a leaf is its index in the batch, any other node (agentIndex, weights, children)
+            if agentIndex == numAgents or gameState.isWin() or gameState.isLose():
+                batch.add(gameState)
+                leaves.append(gameState)
+                return len(leaves) - 1
+            probabilities = None
+            if agentIndex != 0 and distribution != None:
+                probabilities = distribution(gameState, agentIndex)
+            actions = []
+            children = []
+            for action, successor in self.successors(gameState, agentIndex):
+                if stats != None:
+                    stats.countNode(firstPly + agentIndex + 1)
+                actions.append(action)
+                children.append(collect(agentIndex + 1, successor))
+            weights = None
+            if probabilities != None:
+                weights = [probabilities[action] for action in actions]
+            return agentIndex, weights, children
+
+        def backUp(node):
+            if isinstance(node, int):
+                return values[node]
+            agentIndex, weights, children = node
+            return combine(agentIndex, [backUp(child) for child in children], weights)
+
+        tree = collect(agentIndex, gameState)
+        batch.getArrays()
+        values = self.batchEvaluate(batch).tolist()
+        if stats != None:
+            stats.evaluations += len(values)
+        for leaf, value in zip(leaves, values):
+            if isinstance(leaf, SearchNode):
+                leaf.evaluation = value
+        return backUp(tree)
+
+    def transpositionKey(self, gameState, agentIndex, depthLeft):
+        """
+        Returns the transposition table key of the node where agentIndex is to
+        move with depthLeft full rounds left to search, or None if there is no
+        table or the state does not have a position hash.
+        """
+        if self.transpositionTable == None or not hasattr(gameState, 'data'):
+            return None
+        return (gameState.data.getKey(), gameState.data.score, agentIndex, depthLeft)
+
+    def pliesLeft(self, gameState, agentIndex, depthLeft):
+        return depthLeft * gameState.getNumAgents() - agentIndex
+
+    def successors(self, gameState, agentIndex, batched=True, first=None, order=None):
+        """
+        Yields (action, successor) for every legal action of agentIndex, with
+        the action first (if given and legal) ahead of the others, or for the
+        actions the function order returns given the list of legal actions.
+
+        A SearchState is advanced in place and rewound when the loop moves on
+        (or is abandoned by a return), so each successor is only valid inside
+        its own iteration.  Otherwise all successors are built in one
+        generateSuccessors call, unless batched is False: searches that may
+        prune should then get each successor only when they reach it.
+
+        Game states give their actions as direction codes; use actionName to
+        turn the chosen one back into a name.
+        """
+        if isinstance(gameState, SearchNode):
+            if batched and not gameState.children:
+                gameState.expand(agentIndex)
+            for code in self.orderActions(gameState.state.getLegalActionCodes(agentIndex), first, order):
+                yield code, gameState.getChild(agentIndex, code)
+        elif isinstance(gameState, SearchState):
+            for code in self.orderActions(gameState.getLegalActionCodes(agentIndex), first, order):
+                gameState.apply(agentIndex, code)
+                try:
+                    yield code, gameState
+                finally:
+                    gameState.undo()
+        elif batched and hasattr(gameState, 'generateSuccessors'):
+            successors = gameState.generateSuccessors(agentIndex, codes=True)
+            if first != None or order != None:
+                byCode = dict(successors)
+                codes = self.orderActions([code for code, successor in successors], first, order)
+                successors = [(code, byCode[code]) for code in codes]
+            yield from successors
+        elif hasattr(gameState, 'getLegalActionCodes'):
+            for code in self.orderActions(gameState.getLegalActionCodes(agentIndex), first, order):
+                yield code, gameState.generateSuccessor(agentIndex, code)
+        else:
+            for action in self.orderActions(gameState.getLegalActions(agentIndex), first, order):
+                yield action, gameState.generateSuccessor(agentIndex, action)
+
+    def orderActions(self, actions, first, order=None):
+        """
+        Returns the actions in the order given by order, if any, with first
+        moved to the front.
+        """
+        if order != None:
+            actions = order(actions)
+        if first == None or first not in actions:
+            return actions
+        return [first] + [action for action in actions if action != first]
+
+    def actionName(self, action):
+        """
+        Returns the name of an action yielded by successors().
+        """
+        if isinstance(action, int):
+            return Directions.NAMES[action]
+        return action
+
+class SearchNode:
+    """
+    A node of a search tree that is kept from one move to the next (see
+    MultiAgentSearchAgent.treeReuse).  It holds a game state with its
+    successors, once generated, and its evaluation, once computed, so a later
+    search through the same node only has to expand the new frontier.  Other
+    GameState methods are passed through to the state.
+    """
+    __slots__ = ('state', 'children', 'evaluation')
+
+    def __init__(self, state):
+        self.state = state
+        self.children = {}
+        self.evaluation = None
+
+    def __getattr__(self, name):
+        if name == 'state':
+            raise AttributeError(name)
+        return getattr(self.state, name)
+
+    # The methods the searches call at every node, passed on directly
+    def isWin(self):
+        return self.state.data._win
+
+    def isLose(self):
+        return self.state.data._lose
+
+    def getNumAgents(self):
+        return len(self.state.data.agentStates)
+
+    def getData(self):
+        return self.state.data
+    data = property(getData)
+
+    def getChild(self, agentIndex, action):
+        child = self.children.get(action)
+        if child == None:
+            child = SearchNode(self.state.generateSuccessor(agentIndex, action))
+            self.children[action] = child
+        return child
+
+    def expand(self, agentIndex):
+        """
+        Generates all the successors of the node at once.
+        """
+        for code, successor in self.state.generateSuccessors(agentIndex, codes=True):
+            self.children[code] = SearchNode(successor)
+
+    def __len__(self):
+        """
+        Returns the number of nodes in the subtree below and including this one.
+        """
+        return 1 + sum(len(child) for child in self.children.values())
 
 class MinimaxAgent(MultiAgentSearchAgent):
     """
@@ -170,114 +730,401 @@ class MinimaxAgent(MultiAgentSearchAgent):
         Returns whether or not the game state is a losing state
         """
         "*** YOUR CODE HERE ***"
+        self.beginMove()
+        if self.workers > 0 and hasattr(gameState, 'data'):
+            action = self.parallelSearch(gameState)
+        else:
+            action = self.searchRoot(gameState)[0]
+        self.endMove(gameState)
+        return self.actionName(action)
+
+    def searchRoot(self, gameState, actions=None):
+        """
+        Returns the best of the root actions (by default all legal ones) and
+        its minimax value.
+        """
+        stats = self.searchStats
+
+        def combine(agentIndex, values, weights=None):
+            # Pacman; maximizer
+            if agentIndex == 0:
+                return max(values)
+            # Ghost; minimizer
+            return min(values)
 
         def minimax (agentIndex, depth, gameState):
+            if stats != None:
+                stats.countNode(depth * gameState.getNumAgents() + agentIndex)
             if depth == self.depth or gameState.isLose() or gameState.isWin():
-                return self.evaluationFunction(gameState)
+                return self.evaluate(gameState)
+            key = self.transpositionKey(gameState, agentIndex, self.depth - depth)
+            if key != None:
+                value = self.transpositionTable.probe(key)
+                if value != None:
+                    return value
+                plies = self.pliesLeft(gameState, agentIndex, self.depth - depth)
+            batched = self.batchesLastRound(gameState, depth)
             nextAgent = agentIndex + 1
 
             #set to agent-0, pacman, if necessary and increase depth
             if gameState.getNumAgents() == nextAgent:
                 nextAgent = 0
                 depth += 1
-            actions = gameState.getLegalActions(agentIndex)
-
-            # Pacman; maximizer
-            if agentIndex == 0:
-                return max(minimax(nextAgent, depth, gameState.generateSuccessor(agentIndex, nextAction))
-                           for nextAction in actions)
-            # Ghost; minimizer
+            if batched:
+                value = self.evaluateLastRound(gameState, agentIndex, combine)
             else:
-                return min(minimax(nextAgent, depth, gameState.generateSuccessor(agentIndex, nextAction))
-                           for nextAction in actions)
+                values = [minimax(nextAgent, depth, successor)
+                          for nextAction, successor in self.successors(gameState, agentIndex)]
+                value = combine(agentIndex, values)
+            if key != None:
+                self.transpositionTable.store(key, plies, value)
+            return value
 
         # initializing values
         bestAction = Directions.WEST
         maximum = float("-inf")
+        root = self.getSearchRoot(gameState)
+        order = None
+        if actions != None:
+            order = lambda legal: [action for action in legal if action in actions]
+        if stats != None:
+            stats.countNode(0)
 
         # Calculating the best action
-        for action in gameState.getLegalActions(0):
-            value = minimax(1, 0, gameState.generateSuccessor(0, action))
+        for action, successor in self.successors(root, 0, order=order):
+            value = minimax(1, 0, successor)
             if value > maximum:
                 maximum = value
                 bestAction = action
 
         # Return the best action the Pacman should take
-        return bestAction
+        return bestAction, maximum
 
 class AlphaBetaAgent(MultiAgentSearchAgent):
     """
     Your minimax agent with alpha-beta pruning (question 3)
+
+    With iterativeDeepening on, getAction searches to depth 1, 2, 3, ... and
+    plays the best move of the deepest search that finished before the move's
+    time budget ran out.  The budget is moveTime seconds if given, otherwise
+    timeFraction of the move time limit of the game's rules.  maxDepth caps
+    the depth; without a budget (outside a game) it defaults to depth.
+
+    ordering picks the move ordering heuristics (see MoveOrdering), e.g.
+    ordering=pv+killer+history+static; by default moves are tried in the
+    order of getLegalActions.  The number of nodes searched for each move is
+    kept in nodeCounts and printed if reportNodes is on.
     """
 
+    def __init__(self, iterativeDeepening = 'False', maxDepth = '0', ordering = '',
+                 reportNodes = 'False', **args):
+        MultiAgentSearchAgent.__init__(self, **args)
+        self.iterativeDeepening = util.parseBoolean(iterativeDeepening)
+        self.maxDepth = int(maxDepth)
+        self.searchedDepth = 0
+        self.moveOrdering = None
+        if ordering:
+            self.moveOrdering = MoveOrdering(ordering)
+        self.reportNodes = util.parseBoolean(reportNodes)
+        self.nodeCounts = []
+
     def getAction(self, gameState):
         """
         Returns the minimax action using self.depth and self.evaluationFunction
         """
         "*** YOUR CODE HERE ***"
+        self.beginMove()
+        if self.moveOrdering != None:
+            self.moveOrdering.newMove()
+        if self.iterativeDeepening:
+            action = self.deepeningSearch(gameState)
+        else:
+            self.searchedDepth = self.depth
+            action = self.search(gameState, self.depth)
+        self.nodeCounts.append(self.nodeCount)
+        if self.reportNodes:
+            self.printNodeCount(gameState)
+        self.endMove(gameState, self.searchedDepth)
+        return self.actionName(action)
+
+    def printNodeCount(self, gameState):
+        """
+        Prints the nodes searched for the last move and the effective
+        branching factor, the b for which b ** plies == nodes.
+        """
+        plies = self.searchedDepth * gameState.getNumAgents()
+        branching = self.nodeCount ** (1.0 / plies) if plies > 0 else 0
+        print('Searched %d nodes to depth %d (effective branching factor %.2f)' % (
+            self.nodeCount, self.searchedDepth, branching))
 
-        def alphaBetaPrune(agentIndex, depth, gameState, alpha, beta):
-            if depth == self.depth or gameState.isLose() or gameState.isWin():
-                return self.evaluationFunction(gameState)
+    def deepeningSearch(self, gameState):
+        """
+        Searches one round deeper at a time, trying the previous iteration's
+        best move first, and returns the best move of the deepest iteration
+        that finished.  The first iteration always runs to completion.
+        """
+        budget = self.getMoveBudget()
+        maxDepth = self.maxDepth
+        deadline = None
+        if budget != None:
+            deadline = time.time() + budget
+        elif maxDepth <= 0:
+            maxDepth = self.depth
+
+        bestAction = Directions.WEST
+        depth = 0
+        stats = self.searchStats
+        while maxDepth <= 0 or depth < maxDepth:
+            if stats != None:
+                started = time.time()
+                startNodes = stats.getNodes()
+            try:
+                action = self.search(gameState, depth + 1, bestAction, deadline if depth > 0 else None)
+            except SearchTimeout:
+                break
+            depth += 1
+            bestAction = action
+            if stats != None:
+                stats.iterations.append({'depth': depth, 'nodes': stats.getNodes() - startNodes,
+                                         'seconds': time.time() - started})
+            # stop once no leaf was cut off by the depth: a deeper search
+            # would see the same tree
+            if not self.horizonReached:
+                break
+            if deadline != None and time.time() >= deadline:
+                break
+        self.searchedDepth = depth
+        return bestAction
 
+    def search(self, gameState, searchDepth, first=None, deadline=None):
+        """
+        Returns the best action of a search searchDepth rounds deep, trying
+        first before the other moves.  Raises SearchTimeout past the deadline.
+        """
+        if self.workers > 0 and hasattr(gameState, 'data'):
+            return self.parallelSearch(gameState, first, shareAlpha=True,
+                                       searchDepth=searchDepth, deadline=deadline)
+        return self.searchRoot(gameState, searchDepth, first, deadline)[0]
+
+    def searchRoot(self, gameState, searchDepth, first=None, deadline=None,
+                   actions=None, alpha=float("-inf")):
+        """
+        Returns the best of the root actions (by default all legal ones) and
+        its value, searching with the given alpha.
+        """
+        self.horizonReached = False
+        ordering = self.moveOrdering
+        stats = self.searchStats
+        # pv[ply] is the best line found from the node searched last at ply
+        pv = {}
+
+        def alphaBetaPrune(agentIndex, depth, gameState, alpha, beta, onPV=False):
+            self.nodeCount += 1
+            if stats != None:
+                stats.countNode(depth * gameState.getNumAgents() + agentIndex)
+            if depth == searchDepth or gameState.isLose() or gameState.isWin():
+                if depth == searchDepth:
+                    self.horizonReached = True
+                return self.evaluate(gameState)
+            if deadline != None and time.time() > deadline:
+                raise SearchTimeout()
+
+            # a stored value only settles this node if it is exact or a
+            # bound that falls outside the window
+            key = self.transpositionKey(gameState, agentIndex, searchDepth - depth)
+            if key != None:
+                value = self.transpositionTable.probe(key, alpha, beta)
+                if value != None:
+                    # the stored search counts as this one for deepening
+                    if self.transpositionTable.reachedHorizon(key):
+                        self.horizonReached = True
+                    return value
+                window = (alpha, beta)
+                # track whether this subtree alone reaches the horizon
+                horizonReached = self.horizonReached
+                self.horizonReached = False
+
+            numAgents = gameState.getNumAgents()
+            ply = depth * numAgents + agentIndex
+            pliesLeft = self.pliesLeft(gameState, agentIndex, searchDepth - depth)
             nextAgent = agentIndex + 1
 
             # set to agent-0, pacman, if necessary and increase depth
-            if gameState.getNumAgents() == nextAgent:
+            if numAgents == nextAgent:
                 nextAgent = 0
                 depth += 1
 
-            actions = gameState.getLegalActions(agentIndex)
+            # successors are generated lazily so that pruned ones are never built
+            order = None
+            pvAction = None
+            if ordering != None:
+                if onPV:
+                    pvAction = ordering.pvAction(ply)
+                order = lambda actions: ordering.order(gameState, agentIndex, ply, actions, pvAction)
+                pv[ply] = []
+            successors = self.successors(gameState, agentIndex, batched=False, order=order)
+            cutoff = None
 
             # Pacman; Maximizer
             if agentIndex == 0:
-                maximum = float("-inf")
-                for nextAction in actions:
-                    maximum = max(maximum, alphaBetaPrune(nextAgent, depth, gameState.generateSuccessor(agentIndex, nextAction), alpha, beta))
-
-            # Finding and returning the largest value
-                    if maximum > beta:
-                        return maximum
-                    alpha = max(alpha, maximum)
-                return maximum
+                value = float("-inf")
+                for nextAction, successor in successors:
+                    pv[ply + 1] = []
+                    childValue = alphaBetaPrune(nextAgent, depth, successor, alpha, beta,
+                                                onPV and nextAction == pvAction)
+                    if childValue > value:
+                        value = childValue
+                        pv[ply] = [nextAction] + pv[ply + 1]
+
+            # Finding the largest value
+                    if value > beta:
+                        cutoff = nextAction
+                        break
+                    alpha = max(alpha, value)
             # Ghosts; Minimizer
             else:
-                minimum = float("inf")
-                for nextAction in actions:
-                    minimum = min(minimum, alphaBetaPrune(nextAgent, depth, gameState.generateSuccessor(agentIndex, nextAction), alpha, beta))
-
-            # Finding and returning the lowest value
-                    if minimum < alpha:
-                        return minimum
-                    beta = min(beta, minimum)
-                return minimum
+                value = float("inf")
+                for nextAction, successor in successors:
+                    pv[ply + 1] = []
+                    childValue = alphaBetaPrune(nextAgent, depth, successor, alpha, beta,
+                                                onPV and nextAction == pvAction)
+                    if childValue < value:
+                        value = childValue
+                        pv[ply] = [nextAction] + pv[ply + 1]
+
+            # Finding the lowest value
+                    if value < alpha:
+                        cutoff = nextAction
+                        break
+                    beta = min(beta, value)
+            successors.close()
+
+            if cutoff != None:
+                if ordering != None:
+                    ordering.recordCutoff(gameState, agentIndex, ply, cutoff, pliesLeft)
+                if stats != None:
+                    stats.cutoffs += 1
+
+            # values at or outside the window this node was given are bounds
+            if key != None:
+                if value <= window[0]:
+                    bound = util.TranspositionTable.UPPER
+                elif value >= window[1]:
+                    bound = util.TranspositionTable.LOWER
+                else:
+                    bound = util.TranspositionTable.EXACT
+                self.transpositionTable.store(key, pliesLeft, value, bound, self.horizonReached)
+                self.horizonReached = self.horizonReached or horizonReached
+            return value
 
         # initializing values
         bestAction = Directions.WEST
         maximum = float("-inf")
-        alpha = float("-inf")
         beta = float("inf")
+        root = self.getSearchRoot(gameState)
+
+        def order(legal):
+            if actions != None:
+                legal = [action for action in legal if action in actions]
+            if ordering != None:
+                legal = ordering.order(root, 0, 0, legal, ordering.pvAction(0))
+            return legal
+        self.nodeCount += 1
+        if stats != None:
+            stats.countNode(0)
 
         # Calculating the best action
-        for action in gameState.getLegalActions(0):
-            value = alphaBetaPrune(1, 0, gameState.generateSuccessor(0, action), alpha, beta)
+        for action, successor in self.successors(root, 0, batched=False, first=first, order=order):
+            pv[1] = []
+            value = alphaBetaPrune(1, 0, successor, alpha, beta, ordering != None and action == ordering.pvAction(0))
             if value > maximum:
                 maximum = value
                 bestAction = action
+                pv[0] = [action] + pv[1]
 
         # Pruning leaf nodes
             if maximum > beta:
-                return maximum
+                if stats != None:
+                    stats.cutoffs += 1
+                return bestAction, maximum
             alpha = max(alpha, maximum)
 
+        if ordering != None:
+            ordering.pv = pv.get(0, [])
+
         # Return the best action the Pacman should take
-        return bestAction
+        return bestAction, maximum
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when its time budget has run out.
+    """
+    pass
+
+# The layout, GameState class, agent and shared alpha of a worker process of
+# a search pool
+SEARCH_WORKER = {}
+
+def initSearchWorker(layout, stateClass, agent, sharedAlpha):
+    agent.workers = 0
+    SEARCH_WORKER['layout'] = layout
+    SEARCH_WORKER['stateClass'] = stateClass
+    SEARCH_WORKER['agent'] = agent
+    SEARCH_WORKER['alpha'] = sharedAlpha
+
+def searchWorkerTask(packed, action, searchArgs, shareAlpha):
+    """
+    Searches one root action of a packed state in a worker process and
+    returns (action, value, nodes searched, whether the depth cut anything off,
+    the task's SearchStats or None, subtrees pruned).
+    """
+    agent = SEARCH_WORKER['agent']
+    gameState = SEARCH_WORKER['stateClass'].unpack(SEARCH_WORKER['layout'], packed)
+    if shareAlpha:
+        searchArgs = dict(searchArgs, alpha=SEARCH_WORKER['alpha'].value)
+    agent.nodeCount = 0
+    agent.prunedNodes = 0
+    agent.horizonReached = True
+    if agent.collectStats:
+        agent.searchStats = SearchStats()
+    action, value = agent.searchRoot(gameState, actions=[action], **searchArgs)
+    if agent.searchStats != None:
+        agent.searchStats.pruned = agent.prunedNodes
+    return action, value, agent.nodeCount, agent.horizonReached, agent.searchStats, agent.prunedNodes
 
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
       Your expectimax agent (question 4)
+
+      With bounded on, chance nodes are pruned Star1-style: given bounds
+      lowerBound <= evaluation <= upperBound on every leaf, a ghost node stops
+      once even the best or worst outcome of its remaining children could not
+      bring its average back inside the window that matters to the nodes
+      above.  The chosen moves are the same as without pruning.  The bounds
+      are the lowerBound and upperBound agent args if given, otherwise
+      evaluationFunction.valueBounds(gameState, depth) at each move.  The
+      number of subtrees skipped is kept in prunedNodes for the last move and
+      prunedCounts for all of them.
+
+      ghostModel=directional weights each ghost's moves by the distribution
+      of a DirectionalGhost (see getGhostDistribution) instead of taking them
+      as equally likely.
     """
 
+    def __init__(self, bounded = 'False', lowerBound = None, upperBound = None,
+                 ghostModel = 'random', **args):
+        MultiAgentSearchAgent.__init__(self, **args)
+        self.bounded = util.parseBoolean(bounded)
+        self.lowerBound = float(lowerBound) if lowerBound != None else None
+        self.upperBound = float(upperBound) if upperBound != None else None
+        self.prunedCounts = []
+        if ghostModel not in ('directional', 'random'):
+            raise Exception('Unknown ghost model: ' + ghostModel)
+        self.ghostModel = ghostModel
+        self.ghostAgents = {}
+        self.ghostDistributions = {}
+        self.ghostDistributionLayoutText = None
+
     def getAction(self, gameState):
         """
         Returns the expectimax action using self.depth and self.evaluationFunction
@@ -286,9 +1133,89 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         legal moves.
         """
         "*** YOUR CODE HERE ***"
+        self.beginMove()
+        if self.workers > 0 and hasattr(gameState, 'data'):
+            action = self.parallelSearch(gameState, shareAlpha=self.bounded)
+        else:
+            action = self.searchRoot(gameState)[0]
+        if self.bounded:
+            self.prunedCounts.append(self.prunedNodes)
+            if self.searchStats != None:
+                self.searchStats.pruned = self.prunedNodes
+        self.endMove(gameState)
+        return self.actionName(action)
+
+    def getGhostDistribution(self, gameState, agentIndex):
+        """
+        Returns the probabilities of the moves of ghost agentIndex at
+        gameState by direction code, or None if the ghosts are taken to move
+        uniformly at random.  A DirectionalGhost's distribution only depends
+        on the ghost's cell, heading and whether it is scared, and on
+        Pacman's cell, so it is memoized on those for the current layout.
+        """
+        if self.ghostModel == 'random' or not hasattr(gameState, 'data'):
+            return None
+        agentStates = gameState.data.agentStates
+        ghostState = agentStates[agentIndex]
+        conf = ghostState.configuration
+        key = (conf.pos, conf.directionCode, agentStates[0].configuration.pos, ghostState.scaredTimer > 0)
+        distribution = self.ghostDistributions.get(key)
+        if distribution == None:
+            if agentIndex not in self.ghostAgents:
+                self.ghostAgents[agentIndex] = DirectionalGhost(agentIndex)
+            counter = self.ghostAgents[agentIndex].getDistribution(gameState)
+            distribution = dict((Directions.CODES[action], p) for action, p in counter.items())
+            self.ghostDistributions[key] = distribution
+        return distribution
+
+    def getEvaluationBounds(self, gameState):
+        """
+        Returns the (lower, upper) bounds on the evaluation of any leaf of a
+        search from gameState.
+        """
+        if self.lowerBound != None and self.upperBound != None:
+            return self.lowerBound, self.upperBound
+        valueBounds = getattr(self.evaluationFunction, 'valueBounds', None)
+        if valueBounds == None:
+            raise Exception('Bounded expectimax needs lowerBound and upperBound or an '
+                            'evaluation function with valueBounds')
+        return valueBounds(gameState, self.depth)
+
+    def searchRoot(self, gameState, actions=None, alpha=float("-inf")):
+        """
+        Returns the best of the root actions (by default all legal ones) and
+        its expectimax value.  With bounded on, actions worth less than alpha
+        may be cut off.
+        """
+        # the game hands each move a deep copy of the layout, so compare texts
+        if hasattr(gameState, 'data') and gameState.data.layout.layoutText != self.ghostDistributionLayoutText:
+            self.ghostDistributions = {}
+            self.ghostDistributionLayoutText = gameState.data.layout.layoutText
+        stats = self.searchStats
+        def combine(agentIndex, values, weights=None):
+            # Pacman; maximizer
+            if agentIndex == 0:
+                return max(values)
+            # Ghosts modelled by ghostModel; the expected value over their moves
+            if weights != None:
+                return sum(weight * value for weight, value in zip(weights, values))
+            # Ghosts; instead of min find the average of the leaf nodes
+            # return the average, instead of min, of the leaf nodes for expectimax algorithm
+            # get the sum of the leaf nodes and then divide it by the number of leaf nodes giving you the average
+            return sum(values) / len(values)
+
         def expectimax(agentIndex, depth, gameState):
+            if stats != None:
+                stats.countNode(depth * gameState.getNumAgents() + agentIndex)
             if depth == self.depth or gameState.isLose() or gameState.isWin():
-                return self.evaluationFunction(gameState)
+                return self.evaluate(gameState)
+            key = self.transpositionKey(gameState, agentIndex, self.depth - depth)
+            if key != None:
+                value = self.transpositionTable.probe(key)
+                if value != None:
+                    return value
+                plies = self.pliesLeft(gameState, agentIndex, self.depth - depth)
+            batched = self.batchesLastRound(gameState, depth)
             nextAgent = agentIndex + 1;
 
             # set to agent-0, pacman, if necessary and increase depth
@@ -296,32 +1223,448 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
                 nextAgent = 0;
                 depth += 1
 
-            actions = gameState.getLegalActions(agentIndex)
+            if batched:
+                value = self.evaluateLastRound(gameState, agentIndex, combine, self.getGhostDistribution)
+            else:
+                distribution = None
+                if agentIndex != 0:
+                    distribution = self.getGhostDistribution(gameState, agentIndex)
+                actions = []
+                values = []
+                for nextAction, successor in self.successors(gameState, agentIndex):
+                    actions.append(nextAction)
+                    values.append(expectimax(nextAgent, depth, successor))
+                weights = None
+                if distribution != None:
+                    weights = [distribution[action] for action in actions]
+                value = combine(agentIndex, values, weights)
+            if key != None:
+                self.transpositionTable.store(key, plies, value)
+            return value
+
+        def boundedExpectimax(agentIndex, depth, gameState, alpha, beta):
+            """
+            Returns the expectimax value of gameState if it is within [alpha, beta];
+            otherwise it may return an upper bound below alpha or a lower bound
+            above beta.
+            """
+            if stats != None:
+                stats.countNode(depth * gameState.getNumAgents() + agentIndex)
+            if depth == self.depth or gameState.isLose() or gameState.isWin():
+                value = self.evaluate(gameState)
+                if value < lower or value > upper:
+                    raise Exception('Evaluation %s is outside the bounds [%s, %s]' % (value, lower, upper))
+                return value
+            nextAgent = agentIndex + 1
 
-            # Pacman; maximizer
+            # set to agent-0, pacman, if necessary and increase depth
+            if gameState.getNumAgents() == nextAgent:
+                nextAgent = 0
+                depth += 1
+
+            # Pacman; maximizer, pruned as in alpha-beta
             if agentIndex == 0:
-                return max(expectimax(nextAgent, depth, gameState.generateSuccessor(agentIndex, nextAction))
-                           for nextAction in actions)
-            # Ghosts; instead of min find the average of the leaf nodes
-            else:
-            # return the average, instead of min, of the leaf nodes for expectimax algorithm
-            # get the sum of the leaf nodes and then divide it by the number of leaf nodes giving you the average
-                return sum(expectimax(nextAgent, depth, gameState.generateSuccessor(agentIndex, newState))
-                           for newState in actions) / len(actions)
+                value = float("-inf")
+                for nextAction, successor in self.successors(gameState, agentIndex, batched=False):
+                    value = max(value, boundedExpectimax(nextAgent, depth, successor, alpha, beta))
+                    if value > beta:
+                        break
+                    alpha = max(alpha, value)
+                return value
+
+            # Ghosts; the average of the children.  After the first i, with
+            # the rest at their bounds, the average leaves [alpha, beta] if the
+            # next child falls outside [childAlpha, childBeta]
+            n = len(gameState.getLegalActions(agentIndex))
+            distribution = self.getGhostDistribution(gameState, agentIndex)
+            if distribution != None:
+                # the same with the children weighted by their probabilities;
+                # mass is the probability of those not searched yet
+                total = 0
+                mass = 1.0
+                i = 0
+                for nextAction, successor in self.successors(gameState, agentIndex, batched=False):
+                    weight = distribution[nextAction]
+                    mass -= weight
+                    rest = n - i - 1
+                    childAlpha = (alpha - total - mass * upper) / weight
+                    childBeta = (beta - total - mass * lower) / weight
+                    value = boundedExpectimax(nextAgent, depth, successor, childAlpha, childBeta)
+                    if value < childAlpha:
+                        self.prunedNodes += rest
+                        return total + weight * value + mass * upper
+                    if value > childBeta:
+                        self.prunedNodes += rest
+                        return total + weight * value + mass * lower
+                    total += weight * value
+                    i += 1
+                return total
+
+            total = 0
+            i = 0
+            for nextAction, successor in self.successors(gameState, agentIndex, batched=False):
+                rest = n - i - 1
+                childAlpha = n * alpha - total - rest * upper
+                childBeta = n * beta - total - rest * lower
+                value = boundedExpectimax(nextAgent, depth, successor, childAlpha, childBeta)
+                if value < childAlpha:
+                    self.prunedNodes += rest
+                    return (total + value + rest * upper) / n
+                if value > childBeta:
+                    self.prunedNodes += rest
+                    return (total + value + rest * lower) / n
+                total += value
+                i += 1
+            return total / n
 
         # initializing values
         bestAction = Directions.WEST
         maximum = float("-inf")
+        root = self.getSearchRoot(gameState)
+        order = None
+        if actions != None:
+            order = lambda legal: [action for action in legal if action in actions]
+
+        if stats != None:
+            stats.countNode(0)
 
         # Calculating the best action
-        for action in gameState.getLegalActions(0):
-            value = expectimax(1, 0, gameState.generateSuccessor(0, action))
+        if self.bounded:
+            lower, upper = self.getEvaluationBounds(gameState)
+            for action, successor in self.successors(root, 0, batched=False, order=order):
+                value = boundedExpectimax(1, 0, successor, max(alpha, maximum), float("inf"))
+                if value > maximum:
+                    maximum = value
+                    bestAction = action
+            return bestAction, maximum
+
+        for action, successor in self.successors(root, 0, order=order):
+            value = expectimax(1, 0, successor)
             if value > maximum:
                 maximum = value
                 bestAction = action
 
         # Return the best action the Pacman should take
-        return bestAction
+        return bestAction, maximum
+
+class MCTSNode:
+    """
+    A node of an MCTSAgent search tree: the Pacman moves tried from it, with
+    the visits and the total return of the playouts through it.  The ghosts'
+    moves are not part of the tree; they are drawn again on every walk down
+    it.
+    """
+    __slots__ = ('children', 'visits', 'total')
+
+    def __init__(self):
+        self.children = {}
+        self.visits = 0
+        self.total = 0.0
+
+class MCTSAgent(MultiAgentSearchAgent):
+    """
+    Monte Carlo tree search (UCT).  Each playout walks down the tree picking
+    Pacman's moves by UCB1 and drawing the ghosts' moves from ghostModel
+    ('directional' or 'random', as in ghostAgents.py), adds a node, then
+    plays rolloutDepth more rounds with Pacman following rolloutAction.
+    Pacman only considers safeActions, in the tree as in the rollouts.
+    Playouts run on a RolloutSimulator rather than on GameStates.  A playout
+    returns the score it gained less the maze distance from Pacman to the
+    nearest pellet of the root position; the root move with the best mean
+    return is played.  With treeReuse on, that move's subtree seeds the next
+    search.
+
+    The search runs for the move's time budget (see getMoveBudget) or,
+    outside a game, for iterations playouts.  timeFraction defaults to 0.005,
+    so under the default 30 second timeout a move takes at most 0.15 seconds.
+    Playouts per second are kept in rolloutRates and printed if
+    reportRollouts is on.
+    """
+
+    def __init__(self, ghostModel = 'directional', exploration = '1.4', rolloutDepth = '10',
+                 iterations = '500', seed = None, reportRollouts = 'False', timeFraction = '0.005',
+                 **args):
+        MultiAgentSearchAgent.__init__(self, timeFraction=timeFraction, **args)
+        if ghostModel not in ('directional', 'random'):
+            raise Exception('Unknown ghost model: ' + ghostModel)
+        self.ghostModel = ghostModel
+        self.exploration = float(exploration)
+        self.rolloutDepth = int(rolloutDepth)
+        self.iterations = int(iterations)
+        self.random = random.Random(seed)
+        self.reportRollouts = util.parseBoolean(reportRollouts)
+        self.rolloutRates = []
+
+    def getAction(self, gameState):
+        self.beginMove()
+        simulator = RolloutSimulator(gameState)
+        if self.ghostModel == 'directional':
+            ghostAction = simulator.directionalGhostAction
+        else:
+            ghostAction = simulator.randomGhostAction
+        rootState = simulator.getInitialState(gameState)
+        foodField = gameState.data.foodField
+        self.minReturn = float('inf')
+        self.maxReturn = float('-inf')
+        root = None
+        if self.treeReuse and self.tree != None:
+            # the subtree of the move played last time, if Pacman is where it led
+            position, node = self.tree
+            if position == rootState[0]:
+                root = node
+        if root == None:
+            root = MCTSNode()
+
+        budget = self.getMoveBudget()
+        start = time.time()
+        playouts = 0
+        while (time.time() - start < budget) if budget != None else (playouts < self.iterations):
+            state = rootState[:]
+            self.playout(root, state, simulator, ghostAction, foodField)
+            playouts += 1
+
+        elapsed = time.time() - start
+        rate = playouts / elapsed if elapsed > 0 else float('inf')
+        self.rolloutRates.append(rate)
+        if self.reportRollouts:
+            print('%d playouts in %.2fs (%.0f per second)' % (playouts, elapsed, rate))
+        if self.searchStats != None:
+            self.searchStats.playouts = playouts
+
+        # the tree has no fixed depth, so the statistics give none
+        self.endMove(gameState, 0)
+        legal = self.safeActions(rootState, simulator)
+        if not root.children:
+            return Directions.NAMES[legal[0]] if legal else Directions.STOP
+        best = max(legal, key=lambda code: self.meanReturn(root.children[code]) if code in root.children else float('-inf'))
+        if self.treeReuse:
+            dx, dy = Actions._codeVectors[best]
+            self.tree = ((rootState[0][0] + dx, rootState[0][1] + dy), root.children[best])
+        return Directions.NAMES[best]
+
+    def playout(self, root, state, simulator, ghostAction, foodField):
+        """
+        Runs one playout from root on the compact state and backs up its return.
+        """
+        rand = self.random
+        rootScore = state[3]
+        node = root
+        path = [root]
+        last = None
+
+        # selection and expansion
+        while state[4] == 0:
+            legal = self.safeActions(state, simulator)
+            untried = [code for code in legal if code not in node.children]
+            if untried:
+                last = rand.choice(untried)
+                node.children[last] = MCTSNode()
+            else:
+                last = self.selectChild(node, legal)
+            node = node.children[last]
+            path.append(node)
+            self.playRound(state, last, simulator, ghostAction)
+            if untried:
+                break
+
+        # rollout
+        for round in range(self.rolloutDepth):
+            if state[4] != 0:
+                break
+            last = self.rolloutAction(state, simulator, last)
+            self.playRound(state, last, simulator, ghostAction)
+
+        value = state[3] - rootScore
+        if state[4] == 0:
+            value -= foodField.getDistance(state[0])
+        self.minReturn = min(self.minReturn, value)
+        self.maxReturn = max(self.maxReturn, value)
+        for node in path:
+            node.visits += 1
+            node.total += value
+        if self.searchStats != None:
+            # the tree nodes the playout passed, by round of Pacman's moves
+            for ply in range(len(path)):
+                self.searchStats.countNode(ply)
+
+    def safeActions(self, state, simulator):
+        """
+        Returns Pacman's legal moves that do not end next to a ghost that is
+        not scared, or all of them if there are none.
+        """
+        legal = simulator.getLegalActionCodes(state, 0)
+        threats = [state[base] for base in range(5, len(state), 3) if state[base + 2] == 0]
+        if not threats:
+            return legal
+        x, y = state[0]
+        safe = []
+        for code in legal:
+            dx, dy = Actions._codeVectors[code]
+            tx, ty = x + dx, y + dy
+            for gx, gy in threats:
+                if abs(gx - tx) + abs(gy - ty) <= 1:
+                    break
+            else:
+                safe.append(code)
+        return safe or legal
+
+    def rolloutAction(self, state, simulator, last):
+        """
+        Pacman's rollout policy: among the safe moves, take a pellet next to
+        him if there is one, and otherwise move on without turning back.
+        """
+        safe = self.safeActions(state, simulator)
+        x, y = state[0]
+        food = state[1]
+        reverse = Actions._codeReverse[last] if last != None else None
+        eating = []
+        moving = []
+        for code in safe:
+            dx, dy = Actions._codeVectors[code]
+            if food >> ((x + dx) * simulator.height + y + dy) & 1:
+                eating.append(code)
+            if code != 1 and code != reverse:
+                moving.append(code)
+        choices = eating or moving or safe
+        return choices[int(self.random.random() * len(choices))]
+
+    def playRound(self, state, code, simulator, ghostAction):
+        simulator.apply(state, 0, code)
+        for agentIndex in range(1, simulator.numAgents):
+            if state[4] != 0:
+                return
+            simulator.apply(state, agentIndex, ghostAction(state, agentIndex, self.random))
+
+    def meanReturn(self, node):
+        return node.total / node.visits
+
+    def selectChild(self, node, legal):
+        """
+        Returns the move of node with the highest UCB1 score, with the mean
+        returns scaled to [0, 1] by the range of returns seen so far.
+        """
+        spread = self.maxReturn - self.minReturn
+        logVisits = math.log(node.visits)
+        best = None
+        bestScore = float('-inf')
+        for code in legal:
+            child = node.children[code]
+            mean = child.total / child.visits
+            if spread > 0:
+                mean = (mean - self.minReturn) / spread
+            else:
+                mean = 0.5
+            score = mean + self.exploration * math.sqrt(logVisits / child.visits)
+            if score > bestScore:
+                bestScore = score
+                best = code
+        return best
+
+class MoveOrdering:
+    """
+    Orders the moves tried at each alpha-beta node.  heuristics names the
+    heuristics to use, joined by '+', from the strongest to the weakest:
+
+      pv       the move of the best line found by the previous iteration of
+               iterative deepening, while the search is still on that line
+      killer   the last two moves at the same ply that caused a cutoff
+      history  moves by how often they caused cutoffs from the same square,
+               weighted by the square of the plies left below the cutoff
+      static   Pacman moving onto food and away from ghosts; ghosts moving
+               toward Pacman, or away while scared
+
+    Moves tie on heuristics that are not used and keep their legal order.
+    """
+    HEURISTICS = ('pv', 'killer', 'history', 'static')
+
+    def __init__(self, heuristics):
+        self.heuristics = [name for name in heuristics.split('+') if name]
+        for name in self.heuristics:
+            if name not in MoveOrdering.HEURISTICS:
+                raise Exception('Unknown move ordering heuristic: ' + name)
+        self.usePV = 'pv' in self.heuristics
+        self.history = util.Counter()
+        self.newMove()
+
+    def newMove(self):
+        """
+        Forgets the killers and the best line of the last move's search.  The
+        history table is kept for the whole game.
+        """
+        self.killers = {}
+        self.pv = []
+
+    def pvAction(self, ply):
+        if self.usePV and ply < len(self.pv):
+            return self.pv[ply]
+        return None
+
+    def order(self, gameState, agentIndex, ply, actions, pvAction=None):
+        """
+        Returns the actions of agentIndex at gameState sorted best first.
+        """
+        killers = self.killers.get(ply, ())
+        position = self.getPosition(gameState, agentIndex)
+
+        def score(action):
+            scores = []
+            for name in self.heuristics:
+                if name == 'pv':
+                    scores.append(action == pvAction)
+                elif name == 'killer':
+                    scores.append(len(killers) - killers.index(action) if action in killers else 0)
+                elif name == 'history':
+                    scores.append(self.history[(agentIndex, position, action)])
+                else:
+                    scores.append(self.staticScore(gameState, agentIndex, action))
+            return scores
+
+        return sorted(actions, key=score, reverse=True)
+
+    def recordCutoff(self, gameState, agentIndex, ply, action, pliesLeft):
+        """
+        Notes that action caused a cutoff with pliesLeft plies left below it.
+        """
+        killers = self.killers.setdefault(ply, [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+        position = self.getPosition(gameState, agentIndex)
+        self.history[(agentIndex, position, action)] += pliesLeft * pliesLeft
+
+    def getPosition(self, gameState, agentIndex):
+        if not hasattr(gameState, 'data'):
+            return None
+        return gameState.data.agentStates[agentIndex].configuration.pos
+
+    def staticScore(self, gameState, agentIndex, action):
+        """
+        A cheap guess at how good action is for the agent that takes it.
+        """
+        if not hasattr(gameState, 'data'):
+            return 0
+        agentState = gameState.data.agentStates[agentIndex]
+        x, y = agentState.configuration.pos
+        code = Actions.toCode(action)
+        if code == Directions.CODES[Directions.STOP]:
+            return -1
+        dx, dy = Actions.codeToVector(code, 1)
+        target = (x + dx, y + dy)
+
+        if agentIndex == 0:
+            score = 0
+            tx, ty = int(target[0]), int(target[1])
+            if gameState.data.food[tx][ty] or target in gameState.data.capsules:
+                score += 1
+            for ghostState in gameState.data.agentStates[1:]:
+                if manhattanDistance(target, ghostState.configuration.pos) <= 1:
+                    score += 1 if ghostState.scaredTimer > 0 else -2
+            return score
+
+        distance = manhattanDistance(target, gameState.getPacmanPosition())
+        if agentState.scaredTimer > 0:
+            return distance
+        return -distance
 
 def betterEvaluationFunction(currentGameState):
     """
@@ -394,5 +1737,11 @@ def betterEvaluationFunction(currentGameState):
 
     util.raiseNotDefined()
 
+# The food and scared ghost terms of betterEvaluationFunction as a weighted
+# sum of features (see features.py), with a pull toward the nearest pellet
+linearEvaluationFunction = LinearEvaluation({'score': 1, 'foodInverseSum': 1, 'nearestFood': -0.2,
+                                             'nearestScaredGhost': -20})
+
 # Abbreviation
 better = betterEvaluationFunction
+linear = linearEvaluationFunction
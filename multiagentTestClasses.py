@@ -37,6 +37,7 @@ import sys
 import os
 import layout
 import pacman
+import features
 import autograder
 # import grading
 
@@ -180,10 +181,14 @@ class GradingAgent(Agent):
         self.seed = seed
 
     def registerInitialState(self, state):
+        GameState.trackExplored(True)
         if 'registerInitialState' in dir(self.studentAgent):
             self.studentAgent.registerInitialState(state)
         random.seed(self.seed)
 
+    def final(self, state):
+        GameState.trackExplored(False)
+
     def getAction(self, state):
         GameState.getAndResetExplored()
         studentAction = (self.studentAgent.getAction(state),
@@ -288,11 +293,15 @@ class PolyAgent(Agent):
         return (ourpac, alternative_depth_pacs, partial_ply_bug_pacs)
 
     def registerInitialState(self, state):
+        GameState.trackExplored(True)
         for agent in self.solutionAgents + self.alternativeDepthAgents:
             if 'registerInitialState' in dir(agent):
                 agent.registerInitialState(state)
         random.seed(self.seed)
 
+    def final(self, state):
+        GameState.trackExplored(False)
+
     def getAction(self, state):
         # survey agents
         GameState.getAndResetExplored()
@@ -495,6 +504,9 @@ class EvalAgentTest(testClasses.TestCase):
         self.maxPoints = sum([len(t) for t in [
                              self.scoreThresholds, self.nonTimeoutThresholds, self.winsThresholds]])
         self.agentArgs = testDict.get('agentArgs', '')
+        # The weights of a linear evaluation spec (see features.py) for the
+        # agent, in place of its evalFn
+        self.evalSpec = testDict.get('evalSpec')
 
     def execute(self, grades, moduleDict, solutionDict):
         startTime = time.time()
@@ -502,6 +514,9 @@ class EvalAgentTest(testClasses.TestCase):
         agentType = getattr(moduleDict['multiAgents'], self.agentName)
         agentOpts = pacman.parseAgentArgs(
             self.agentArgs) if self.agentArgs != '' else {}
+        if self.evalSpec != None:
+            agentOpts['evalFn'] = 'spec'
+            agentOpts.update(features.readEvaluationSpec(self.evalSpec.split('\n')))
         agent = agentType(**agentOpts)
 
         lay = layout.getLayout(self.layoutName, 3)
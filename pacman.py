@@ -43,6 +43,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util
@@ -77,12 +78,26 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable keeps track of which states have been generated; None
+    # (the default) turns the bookkeeping off
+    explored = None
+
+    def trackExplored(enabled=True):
+        """
+        Turns counting of generated states on or off.  Only the grading
+        harness needs it, so games run without it by default.
+        """
+        if enabled:
+            GameState.explored = ExploredCounter()
+        else:
+            GameState.explored = None
+    trackExplored = staticmethod(trackExplored)
 
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
-        GameState.explored = set()
+        tmp = GameState.explored
+        if tmp == None:
+            return set()
+        GameState.explored = ExploredCounter()
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
@@ -99,6 +114,19 @@ class GameState:
         else:
             return GhostRules.getLegalActions(self, agentIndex)
 
+    def getLegalActionCodes(self, agentIndex=0):
+        """
+        Returns the legal actions of the agent as a tuple of direction codes
+        (see Directions.CODES), in the same order as getLegalActions.
+        """
+        if self.isWin() or self.isLose():
+            return ()
+
+        if agentIndex == 0:
+            return Actions.MASK_CODES[PacmanRules.getLegalActionMask(self)]
+        else:
+            return Actions.MASK_CODES[GhostRules.getLegalActionMask(self, agentIndex)]
+
     def generateSuccessor(self, agentIndex, action):
         """
         Returns the successor state after the specified agent takes the action.
@@ -109,29 +137,63 @@ class GameState:
 
         # Copy current state
         state = GameState(self)
+        state.applyRules(agentIndex, action)
+        state.data.updateKey(self.data._key, self.data.agentStates)
+        if GameState.explored != None:
+            GameState.explored.add(self)
+            GameState.explored.add(state)
+        return state
 
+    def generateSuccessors(self, agentIndex, codes=False):
+        """
+        Returns a list of (action, successor) pairs, one for each legal action
+        of the agent, in the order of getLegalActions.  This is equivalent to
+        calling generateSuccessor for each action, but the terminal check and
+        the legal moves are worked out once, and the rules do not re-check the
+        legality of moves that came from getLegalActions.  With codes=True the
+        actions are given as direction codes rather than names.
+        """
+        if self.isWin() or self.isLose():
+            return []
+
+        successors = []
+        for code in self.getLegalActionCodes(agentIndex):
+            state = GameState(self)
+            state.applyRules(agentIndex, code, checkLegal=False)
+            state.data.updateKey(self.data._key, self.data.agentStates)
+            successors.append((code if codes else Directions.NAMES[code], state))
+
+        if GameState.explored != None:
+            GameState.explored.add(self)
+            for action, state in successors:
+                GameState.explored.add(state)
+        return successors
+
+    def applyRules(self, agentIndex, action, checkLegal=True):
+        """
+        Plays one move on this state's own data.  The data must be a fresh copy
+        of its predecessor (see generateSuccessor) or an undoable SearchState.
+        """
         # Let agent's logic deal with its action's effects on the board
         if agentIndex == 0:  # Pacman is moving
-            state.data._eaten = [False for i in range(state.getNumAgents())]
-            PacmanRules.applyAction(state, action)
+            self.data._eaten = [False for i in range(self.getNumAgents())]
+            PacmanRules.applyAction(self, action, checkLegal)
         else:                # A ghost is moving
-            GhostRules.applyAction(state, action, agentIndex)
+            GhostRules.applyAction(self, action, agentIndex, checkLegal)
 
         # Time passes
         if agentIndex == 0:
-            state.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
+            self.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
         else:
-            GhostRules.decrementTimer(state.data.agentStates[agentIndex])
+            self.data.setAgentState(agentIndex, GhostRules.decrementTimer(
+                self.data.agentStates[agentIndex]))
 
         # Resolve multi-agent effects
-        GhostRules.checkDeath(state, agentIndex)
+        GhostRules.checkDeath(self, agentIndex)
 
         # Book keeping
-        state.data._agentMoved = agentIndex
-        state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
-        return state
+        self.data._agentMoved = agentIndex
+        self.data.score += self.data.scoreChange
 
     def getLegalPacmanActions(self):
         return self.getLegalActions(0)
@@ -209,6 +271,33 @@ class GameState:
         """
         return self.data.layout.walls
 
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the length of the shortest path between two positions through
+        the maze.  Distances are precomputed per layout, so this is a lookup.
+        """
+        return self.data.layout.getMazeDistance(pos1, pos2)
+
+    def getNearestFoodDistance(self, pos=None):
+        """
+        Returns the maze distance from pos (by default Pacman's position) to
+        the nearest pellet, or inf if none is left.  The distances are kept
+        up to date from state to state as pellets are eaten, so this is
+        usually a lookup.
+        """
+        if pos == None:
+            pos = self.getPacmanPosition()
+        return self.data.foodField.getDistance(pos)
+
+    def getNearestCapsuleDistance(self, pos=None):
+        """
+        Returns the maze distance from pos (by default Pacman's position) to
+        the nearest capsule, or inf if none is left.
+        """
+        if pos == None:
+            pos = self.getPacmanPosition()
+        return self.data.capsuleField.getDistance(pos)
+
     def hasFood(self, x, y):
         return self.data.food[x][y]
 
@@ -262,6 +351,36 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+    def pack(self):
+        """
+        Returns the state as a compact tuple (see GameStateData.pack).
+        """
+        return self.data.pack()
+
+    def unpack(layout, packed):
+        """
+        Returns the state made by pack() for a game on layout.
+        """
+        state = GameState()
+        state.data.unpack(layout, packed)
+        return state
+    unpack = staticmethod(unpack)
+
+class ExploredCounter:
+    """
+    Counts the distinct states passed to add().  Only the (key, score) pair of
+    each state is kept, so the states themselves can be freed.
+    """
+
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, state):
+        self.keys.add((state.data.getKey(), state.data.score))
+
+    def __len__(self):
+        return len(self.keys)
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -269,9 +388,9 @@ class GameState:
 ############################################################################
 
 
-SCARED_TIME = 40    # Moves ghosts are scared
-COLLISION_TOLERANCE = 0.7  # How close ghosts must be to Pacman to kill
-TIME_PENALTY = 1  # Number of points lost each round
+# The constants of the classic rules live in game.py, where RolloutSimulator
+# shares them
+from game import SCARED_TIME, COLLISION_TOLERANCE, TIME_PENALTY, GHOST_SPEED
 
 
 class ClassicGameRules:
@@ -348,23 +467,37 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions(state.getPacmanState().configuration, state.data.layout.walls)
+        return list(Actions.MASK_NAMES[PacmanRules.getLegalActionMask(state)])
     getLegalActions = staticmethod(getLegalActions)
 
-    def applyAction(state, action):
+    def getLegalActionMask(state):
         """
-        Edits the state to reflect the results of the action.
+        Returns the possible actions as a mask of direction codes.
         """
-        legal = PacmanRules.getLegalActions(state)
-        if action not in legal:
-            raise Exception("Illegal action " + str(action))
+        conf = state.data.agentStates[0].configuration
+        mask = state.data.layout.legalActions.get(conf.pos)
+        if mask == None:
+            return Actions.toMask(Actions.getPossibleActions(conf, state.data.layout.walls))
+        return mask
+    getLegalActionMask = staticmethod(getLegalActionMask)
+
+    def applyAction(state, action, checkLegal=True):
+        """
+        Edits the state to reflect the results of the action, given by name
+        or by direction code.
+        """
+        code = Actions.toCode(action)
+        if checkLegal:
+            if not Actions.isLegal(code, PacmanRules.getLegalActionMask(state)):
+                raise Exception("Illegal action " + str(action))
 
         pacmanState = state.data.agentStates[0]
 
         # Update Configuration
-        vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
-        pacmanState.configuration = pacmanState.configuration.generateSuccessor(
-            vector)
+        vector = Actions.codeToVector(code, PacmanRules.PACMAN_SPEED)
+        pacmanState = pacmanState.replace(
+            configuration=pacmanState.configuration.generateSuccessor(vector))
+        state.data.setAgentState(0, pacmanState)
 
         # Eat
         next = pacmanState.configuration.getPosition()
@@ -381,6 +514,7 @@ class PacmanRules:
             state.data.scoreChange += 10
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
+            state.data.foodField = state.data.foodField.without(position)
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -389,11 +523,15 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if(position in state.getCapsules()):
-            state.data.capsules.remove(position)
+            capsules = state.data.capsules[:]
+            capsules.remove(position)
+            state.data.capsules = capsules
+            state.data.capsuleField = state.data.capsuleField.without(position)
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range(1, len(state.data.agentStates)):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.setAgentState(index, state.data.agentStates[index].replace(
+                    scaredTimer=SCARED_TIME))
     consume = staticmethod(consume)
 
 
@@ -401,14 +539,26 @@ class GhostRules:
     """
     These functions dictate how ghosts interact with their environment.
     """
-    GHOST_SPEED = 1.0
+    GHOST_SPEED = GHOST_SPEED
 
     def getLegalActions(state, ghostIndex):
         """
         Ghosts cannot stop, and cannot turn around unless they
         reach a dead end, but can turn 90 degrees at intersections.
         """
-        conf = state.getGhostState(ghostIndex).configuration
+        return list(Actions.MASK_NAMES[GhostRules.getLegalActionMask(state, ghostIndex)])
+    getLegalActions = staticmethod(getLegalActions)
+
+    def getLegalActionMask(state, ghostIndex):
+        """
+        Returns the ghost's possible actions as a mask of direction codes.
+        """
+        conf = state.data.agentStates[ghostIndex].configuration
+        headings = state.data.layout.legalGhostActions.get(conf.pos)
+        if headings != None and conf.directionCode != None:
+            return headings[conf.directionCode]
+
+        # Scared ghosts can stand between cells
         possibleActions = Actions.getPossibleActions(
             conf, state.data.layout.walls)
         reverse = Actions.reverseDirection(conf.direction)
@@ -416,30 +566,35 @@ class GhostRules:
             possibleActions.remove(Directions.STOP)
         if reverse in possibleActions and len(possibleActions) > 1:
             possibleActions.remove(reverse)
-        return possibleActions
-    getLegalActions = staticmethod(getLegalActions)
-
-    def applyAction(state, action, ghostIndex):
+        return Actions.toMask(possibleActions)
+    getLegalActionMask = staticmethod(getLegalActionMask)
 
-        legal = GhostRules.getLegalActions(state, ghostIndex)
-        if action not in legal:
-            raise Exception("Illegal ghost action " + str(action))
+    def applyAction(state, action, ghostIndex, checkLegal=True):
+        code = Actions.toCode(action)
+        if checkLegal:
+            if not Actions.isLegal(code, GhostRules.getLegalActionMask(state, ghostIndex)):
+                raise Exception("Illegal ghost action " + str(action))
 
         ghostState = state.data.agentStates[ghostIndex]
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0:
             speed /= 2.0
-        vector = Actions.directionToVector(action, speed)
-        ghostState.configuration = ghostState.configuration.generateSuccessor(
-            vector)
+        vector = Actions.codeToVector(code, speed)
+        state.data.setAgentState(ghostIndex, ghostState.replace(
+            configuration=ghostState.configuration.generateSuccessor(vector)))
     applyAction = staticmethod(applyAction)
 
     def decrementTimer(ghostState):
+        """
+        Returns the ghost's AgentState after one tick of its scared timer.
+        """
         timer = ghostState.scaredTimer
+        if timer == 0:
+            return ghostState
+        conf = ghostState.configuration
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint(
-                ghostState.configuration.pos)
-        ghostState.scaredTimer = max(0, timer - 1)
+            conf = Configuration(nearestPoint(conf.pos), conf.direction)
+        return ghostState.replace(configuration=conf, scaredTimer=timer - 1)
     decrementTimer = staticmethod(decrementTimer)
 
     def checkDeath(state, agentIndex):
@@ -460,9 +615,10 @@ class GhostRules:
     def collide(state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
             state.data.scoreChange += 200
-            GhostRules.placeGhost(state, ghostState)
-            ghostState.scaredTimer = 0
-            # Added for first-person
+            ghostState = GhostRules.placeGhost(state, ghostState)
+            state.data.setAgentState(agentIndex, ghostState.replace(scaredTimer=0))
+            # Added for first-person; the list may be shared with the parent
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -475,7 +631,10 @@ class GhostRules:
     canKill = staticmethod(canKill)
 
     def placeGhost(state, ghostState):
-        ghostState.configuration = ghostState.start
+        """
+        Returns the ghost's AgentState sent back to its starting position.
+        """
+        return ghostState.replace(configuration=ghostState.start)
     placeGhost = staticmethod(placeGhost)
 
 #############################
@@ -554,6 +713,8 @@ def readCommand(argv):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--searchStats', dest='searchStats',
+                      help='Write the search statistics of each Pacman move to this file, one JSON object per line', default=None)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -580,6 +741,10 @@ def readCommand(argv):
             agentOpts['numTraining'] = options.numTraining
     pacman = pacmanType(**agentOpts)  # Instantiate Pacman with agentArgs
     args['pacman'] = pacman
+    if options.searchStats != None:
+        if not hasattr(pacman, 'setSearchStats'):
+            raise Exception('--searchStats needs a search agent, not ' + options.pacman)
+        pacman.setSearchStats(open(options.searchStats, 'w'))
 
     # Don't display training games
     if 'numTrain' in agentOpts:
@@ -705,6 +870,10 @@ def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, c
             pickle.dump(components, f)
             f.close()
 
+    # a game that ended in a crash or timeout never called final()
+    if hasattr(pacman, 'close'):
+        pacman.close()
+
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
         wins = [game.state.isWin() for game in games]
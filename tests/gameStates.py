@@ -0,0 +1,47 @@
+# gameStates.py
+# -------------
+# Layouts and fresh game states shared by the tests in this directory.
+
+import layout
+import textDisplay
+from ghostAgents import RandomGhost
+from pacman import ClassicGameRules, GameState
+
+LAYOUTS = ['smallClassic', 'mediumClassic', 'trickyClassic', 'capsuleClassic',
+           'minimaxClassic', 'openClassic']
+
+def newGame(name, numGhosts=4):
+    """
+    A GameState at the start of a game on the named layout, with at most
+    numGhosts ghosts.
+    """
+    gameState = GameState()
+    gameState.initialize(layout.getLayout(name), numGhosts)
+    return gameState
+
+def randomLine(name, moves, rand, numGhosts=4):
+    """
+    The states with Pacman to move along a game of up to moves random moves
+    by every agent, drawn with the random.Random rand.
+    """
+    gameState = newGame(name, numGhosts)
+    states = []
+    while len(states) < moves and not (gameState.isWin() or gameState.isLose()):
+        states.append(gameState)
+        for agentIndex in range(gameState.getNumAgents()):
+            if gameState.isWin() or gameState.isLose():
+                break
+            gameState = gameState.generateSuccessor(agentIndex, rand.choice(gameState.getLegalActions(agentIndex)))
+    return states
+
+def playGame(name, pacman, timeout=30, numGhosts=2):
+    """
+    Plays a quiet game of pacman against RandomGhosts on the named layout,
+    with the rules' time limits enforced, and returns the Game.
+    """
+    lay = layout.getLayout(name)
+    ghosts = [RandomGhost(index + 1) for index in range(min(numGhosts, lay.getNumGhosts()))]
+    game = ClassicGameRules(timeout).newGame(lay, pacman, ghosts, textDisplay.NullGraphics(),
+                                             quiet=True, catchExceptions=True)
+    game.run()
+    return game
@@ -0,0 +1,40 @@
+# test_agentState.py
+# ------------------
+# Checks that the immutable Configuration and AgentState values keep their
+# precomputed hashes and their per-layout interning.
+# Run from the project directory with: python -m pytest tests
+
+import unittest
+
+import layout
+from game import AgentState, Configuration, Directions
+from gameStates import newGame
+
+class AgentStateTest(unittest.TestCase):
+
+    def testReplaceRecomputesTheHash(self):
+        agentState = newGame('smallClassic').data.agentStates[1]
+        for changed in [agentState._replace(scaredTimer=7),
+                        agentState._replace(configuration=Configuration((1, 1), Directions.STOP))]:
+            self.assertTrue(isinstance(changed, AgentState))
+            expected = agentState.replace(configuration=changed.configuration,
+                                          scaredTimer=changed.scaredTimer)
+            self.assertEqual(changed, expected)
+            self.assertEqual(hash(changed), hash(expected))
+        self.assertRaises(AttributeError, agentState._replace, hashValue=0)
+
+    def testConfigurationsAreInternedPerLayout(self):
+        small = newGame('smallClassic')
+        medium = newGame('mediumClassic')
+        smallTable = small.data.layout.getConfigurationTable()
+        mediumTable = medium.data.layout.getConfigurationTable()
+        self.assertTrue(smallTable is not mediumTable)
+        for agentState in medium.data.agentStates:
+            self.assertTrue(mediumTable[(agentState.getPosition(), Directions.STOP)] is agentState.configuration)
+        # a new game on the same board shares the configurations of the first
+        again = newGame('smallClassic')
+        self.assertTrue(again.data.agentStates[0].configuration is small.data.agentStates[0].configuration)
+        self.assertTrue(layout.getLayout('smallClassic').getConfigurationTable() is smallTable)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# test_alphaBetaAgent.py
+# ----------------------
+# Checks that the options of AlphaBetaAgent change how it searches but not
+# what it finds, on fixed lines of play.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+from gameStates import playGame, randomLine
+from multiAgents import AlphaBetaAgent
+
+class AlphaBetaAgentTest(unittest.TestCase):
+
+    def testTranspositionTableKeepsTheDeepeningDepth(self):
+        # entries left from earlier moves must not make a search look as if
+        # it saw the whole tree
+        for name in ['smallClassic', 'mediumClassic']:
+            plain = AlphaBetaAgent(iterativeDeepening='True', maxDepth='3', moveTime='100')
+            table = AlphaBetaAgent(iterativeDeepening='True', maxDepth='3', moveTime='100',
+                                   transpositionTable='100000')
+            for gameState in randomLine(name, 10, random.Random(12), numGhosts=2):
+                action = plain.getAction(gameState)
+                self.assertEqual(table.getAction(gameState), action)
+                self.assertEqual(table.searchedDepth, plain.searchedDepth)
+
+    def testMoveBudgetLeavesTimeForTheRestOfTheGame(self):
+        agent = AlphaBetaAgent(iterativeDeepening='True')
+        agent.setMoveTimeLimit(3, 3)
+        self.assertAlmostEqual(agent.getMoveBudget(), 0.15)
+        agent.gameTimeUsed = 1.4
+        self.assertAlmostEqual(agent.getMoveBudget(), 0.01)
+        agent.gameTimeUsed = 2
+        self.assertEqual(agent.getMoveBudget(), 0)
+        agent.setMoveTimeLimit(3)
+        self.assertAlmostEqual(agent.getMoveBudget(), 0.3)
+
+    def testTimedDeepeningFinishesATimedGame(self):
+        game = playGame('smallClassic', AlphaBetaAgent(iterativeDeepening='True'), timeout=2)
+        self.assertTrue(game.gameOver)
+        self.assertFalse(game.agentTimeout)
+        self.assertTrue(game.totalAgentTimes[0] <= 2)
+
+if __name__ == '__main__':
+    unittest.main()
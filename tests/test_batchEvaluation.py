@@ -0,0 +1,30 @@
+# test_batchEvaluation.py
+# -----------------------
+# Checks that searches with batchEval pick the moves of the per-leaf search,
+# for evaluation functions with and without a batchEvaluate.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+from gameStates import randomLine
+from multiAgents import ExpectimaxAgent, MinimaxAgent
+
+class BatchEvaluationTest(unittest.TestCase):
+
+    def testSameMovesWithAndWithoutBatches(self):
+        states = randomLine('mediumClassic', 6, random.Random(18), numGhosts=2)
+        for agentClass in [MinimaxAgent, ExpectimaxAgent]:
+            for evalFn in ['scoreEvaluationFunction', 'linear', 'better']:
+                plain = agentClass(depth='2', evalFn=evalFn)
+                batched = agentClass(depth='2', evalFn=evalFn, batchEval='True')
+                for gameState in states:
+                    self.assertEqual(batched.getAction(gameState), plain.getAction(gameState),
+                                     '%s with %s' % (agentClass.__name__, evalFn))
+
+    def testOnlyFeatureFunctionsAreBatched(self):
+        self.assertTrue(MinimaxAgent(evalFn='linear', batchEval='True').batchEvaluate != None)
+        self.assertTrue(MinimaxAgent(evalFn='better', batchEval='True').batchEvaluate == None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# test_distanceField.py
+# ---------------------
+# Checks the DistanceFields that game states keep to the nearest pellet and
+# capsule against breadth-first searches from scratch, along random games.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+from gameStates import LAYOUTS, newGame
+from game import SearchState
+
+def nearestDistances(walls, targets):
+    """
+    The maze distance from every reachable cell to the nearest of targets.
+    """
+    distances = dict((pos, 0) for pos in targets)
+    frontier = list(targets)
+    while frontier:
+        nextFrontier = []
+        for x, y in frontier:
+            for next in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+                if next not in distances and not walls[next[0]][next[1]]:
+                    distances[next] = distances[(x, y)] + 1
+                    nextFrontier.append(next)
+        frontier = nextFrontier
+    return distances
+
+class DistanceFieldTest(unittest.TestCase):
+
+    def assertFieldsMatch(self, gameState, cells):
+        walls = gameState.getWalls()
+        food = nearestDistances(walls, gameState.getFood().asList())
+        capsules = nearestDistances(walls, gameState.getCapsules())
+        for cell in cells + [gameState.getPacmanPosition()]:
+            self.assertEqual(gameState.getNearestFoodDistance(cell), food.get(cell, float('inf')))
+            self.assertEqual(gameState.getNearestCapsuleDistance(cell), capsules.get(cell, float('inf')))
+
+    def testRandomGames(self):
+        rand = random.Random(22)
+        for name in LAYOUTS:
+            for game in range(3):
+                gameState = newGame(name)
+                walls = gameState.getWalls()
+                cells = walls.asList(False)
+                while not (gameState.isWin() or gameState.isLose()):
+                    for agentIndex in range(gameState.getNumAgents()):
+                        if gameState.isWin() or gameState.isLose():
+                            break
+                        action = rand.choice(gameState.getLegalActions(agentIndex))
+                        gameState = gameState.generateSuccessor(agentIndex, action)
+                    self.assertFieldsMatch(gameState, rand.sample(cells, 5))
+
+    def testGreedyGamesEatEveryPellet(self):
+        # Pacman heads for the nearest pellet and checks the fields only now
+        # and then, so whole lineages of removals are worked out at once
+        for name in ['smallClassic', 'openClassic']:
+            gameState = newGame(name)
+            for agentIndex in range(1, gameState.getNumAgents()):
+                gameState.data.agentStates[agentIndex] = gameState.data.agentStates[agentIndex].replace(
+                    scaredTimer=10 ** 6)
+            moves = 0
+            while not (gameState.isWin() or gameState.isLose()) and moves < 2000:
+                if moves % 7 == 0:
+                    self.assertFieldsMatch(gameState, [])
+                successors = [gameState.generatePacmanSuccessor(action)
+                              for action in gameState.getLegalPacmanActions()]
+                gameState = min(successors, key=lambda successor: (
+                    successor.getNumFood(), successor.getNearestFoodDistance()))
+                moves += 1
+            self.assertTrue(gameState.isWin())
+            self.assertFieldsMatch(gameState, [])
+
+    def testSearchStateApplyAndUndo(self):
+        rand = random.Random(7)
+        for name in LAYOUTS:
+            state = SearchState(newGame(name))
+            cells = state.getWalls().asList(False)
+            for step in range(300):
+                if state.history and (state.isWin() or state.isLose() or rand.random() < 0.3):
+                    state.undo()
+                elif state.isWin() or state.isLose():
+                    break
+                else:
+                    agentIndex = len(state.history) % state.getNumAgents()
+                    state.apply(agentIndex, rand.choice(state.getLegalActions(agentIndex)))
+                self.assertFieldsMatch(state, rand.sample(cells, 3))
+
+if __name__ == '__main__':
+    unittest.main()
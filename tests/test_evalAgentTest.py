@@ -0,0 +1,30 @@
+# test_evalAgentTest.py
+# ---------------------
+# Runs the EvalAgentTest in specAgent.test, whose agent plays with an inline
+# evalSpec, outside the graded questions.
+# Run from the project directory with: python -m pytest tests
+
+import os
+import unittest
+
+import grading
+import multiAgents
+import testClasses
+import testParser
+import textDisplay
+from multiagentTestClasses import EvalAgentTest
+
+class EvalAgentTestTest(unittest.TestCase):
+
+    def testInlineEvalSpec(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'specAgent.test')
+        testDict = testParser.TestParser(path).parse()
+        question = testClasses.PassAllTestsQuestion({'max_points': '0'}, textDisplay.NullGraphics())
+        testCase = EvalAgentTest(question, testDict)
+        grades = grading.Grades('spec', [('spec', 0)], muteOutput=True)
+        grades.currentQuestion = 'spec'
+        passed = testCase.execute(grades, {'multiAgents': multiAgents}, {})
+        self.assertTrue(passed, '\n'.join(grades.messages['spec']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# test_evaluationCache.py
+# -----------------------
+# Checks util.EvaluationCache's LRU and that searches with evalCache=N find
+# the same moves and values as searches without it.
+# Run from the project directory with: python -m pytest tests
+
+import pickle
+import random
+import unittest
+
+import util
+from gameStates import LAYOUTS, randomLine
+from multiAgents import (AlphaBetaAgent, ExpectimaxAgent, betterEvaluationFunction,
+                         scoreEvaluationFunction)
+
+class EvaluationCacheTest(unittest.TestCase):
+
+    def testCachedValuesMatchTheFunction(self):
+        cache = util.EvaluationCache(betterEvaluationFunction, 100000)
+        for name in LAYOUTS:
+            for gameState in randomLine(name, 40, random.Random(23)) * 2:
+                self.assertEqual(cache(gameState), betterEvaluationFunction(gameState))
+        self.assertTrue(cache.hits > 0)
+
+    def testScoreIsPartOfTheKey(self):
+        cache = util.EvaluationCache(scoreEvaluationFunction, 10)
+        gameState = randomLine('openClassic', 1, random.Random(4))[0]
+        richer = gameState.deepCopy()
+        richer.data.score += 100
+        self.assertEqual(cache(gameState), gameState.getScore())
+        self.assertEqual(cache(richer), gameState.getScore() + 100)
+
+    def testLeastRecentlyUsedIsEvicted(self):
+        states = randomLine('openClassic', 5, random.Random(4), numGhosts=1)
+        cache = util.EvaluationCache(scoreEvaluationFunction, 3)
+        for gameState in states[:3]:
+            cache(gameState)
+        cache(states[0])
+        cache(states[3])
+        self.assertEqual(len(cache.entries), 3)
+        self.assertEqual(cache.evictions, 1)
+        hits = cache.hits
+        cache(states[0])
+        self.assertEqual(cache.hits, hits + 1)
+        cache(states[1])
+        self.assertEqual(cache.hits, hits + 1)
+        self.assertTrue(len(cache.entries) <= 3)
+
+    def testPicklesWithoutEntries(self):
+        cache = util.EvaluationCache(scoreEvaluationFunction, 10)
+        cache(randomLine('openClassic', 1, random.Random(4))[0])
+        copy = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(len(copy.entries), 0)
+        self.assertTrue(copy.valueBounds is scoreEvaluationFunction.valueBounds)
+
+    def testSearchesFindTheSameValues(self):
+        for name in ['smallClassic', 'mediumClassic']:
+            states = randomLine(name, 10, random.Random(23), numGhosts=2)
+            for agentClass, search in [(AlphaBetaAgent, lambda agent, s: agent.searchRoot(s, 2)),
+                                       (ExpectimaxAgent, lambda agent, s: agent.searchRoot(s))]:
+                plain = agentClass(depth='2', evalFn='betterEvaluationFunction')
+                expected = [search(plain, gameState) for gameState in states]
+                for size in ['100000', '50']:
+                    agent = agentClass(depth='2', evalFn='betterEvaluationFunction', evalCache=size)
+                    for gameState, result in zip(states, expected):
+                        self.assertEqual(search(agent, gameState), result)
+                    self.assertTrue(agent.evaluationCache.hits > 0)
+                    self.assertTrue(len(agent.evaluationCache.entries) <= int(size))
+
+if __name__ == '__main__':
+    unittest.main()
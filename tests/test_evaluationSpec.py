@@ -0,0 +1,65 @@
+# test_evaluationSpec.py
+# ----------------------
+# Checks the reading of evaluation spec files and evalFn=spec agents.
+# Run from the project directory with: python -m pytest tests
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import features
+from gameStates import randomLine
+from multiAgents import ExpectimaxAgent
+
+SPEC = """# weights for a test
+score: 1
+nearestFood: -0.5   # closer is better
+
+  foodLeft : -4e0
+"""
+
+class EvaluationSpecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.spec')
+        with open(self.path, 'w') as f:
+            f.write(SPEC)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testCommentsAndBlankLinesAreSkipped(self):
+        self.assertEqual(features.readEvaluationSpec(SPEC.splitlines()),
+                         {'score': 1.0, 'nearestFood': -0.5, 'foodLeft': -4.0})
+        self.assertEqual(features.loadEvaluationSpec(self.path),
+                         {'score': 1.0, 'nearestFood': -0.5, 'foodLeft': -4.0})
+
+    def testBadLinesAreRejected(self):
+        for line in ['score 1', 'nearestPellet: 1', 'score: one']:
+            self.assertRaises(Exception, features.readEvaluationSpec, ['score: 1', line])
+        with self.assertRaises(Exception) as raised:
+            features.readEvaluationSpec(['score: 1', '', 'score 1'])
+        self.assertTrue('line 3' in str(raised.exception))
+
+    def testArgumentsOverrideTheFile(self):
+        evaluation = features.specEvaluation(self.path, {'nearestFood': '-2', 'bias': '3'})
+        self.assertEqual(evaluation.weights,
+                         {'score': 1.0, 'nearestFood': -2.0, 'foodLeft': -4.0, 'bias': 3.0})
+        self.assertEqual(features.specEvaluation(weights={'score': 1}).weights, {'score': 1.0})
+        self.assertRaises(Exception, features.specEvaluation, self.path, {'nearestPellet': 1})
+
+    def testSpecAgentsEvaluateTheSpec(self):
+        agent = ExpectimaxAgent(depth='1', evalFn='spec:' + self.path, nearestFood='-2')
+        weights = {'score': 1.0, 'nearestFood': -2.0, 'foodLeft': -4.0}
+        for gameState in randomLine('smallClassic', 10, random.Random(24), numGhosts=2):
+            expected = sum(weight * value for weight, value in
+                           zip([weights.get(name, 0) for name in features.FEATURES],
+                               features.ALL_FEATURES(gameState)))
+            self.assertAlmostEqual(agent.evaluationFunction(gameState), expected, places=9)
+        self.assertRaises(Exception, ExpectimaxAgent, depth='1', nearestFood='-2')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# test_features.py
+# ----------------
+# Checks that every feature comes out the same from the compiled scalar code
+# (FEATURE_CODE) and from FeatureExtractor.getBatchFeatures, and that
+# LinearEvaluations agree with themselves in both forms.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+import features
+from gameStates import LAYOUTS, randomLine
+
+def sampleStates(rand):
+    """
+    States along random games on every layout, with some scared ghosts.
+    """
+    states = []
+    for name in LAYOUTS:
+        for gameState in randomLine(name, 60, rand)[::3]:
+            states.append(gameState)
+            scared = gameState.deepCopy()
+            agentStates = scared.data.agentStates
+            for index in range(1, len(agentStates), 2):
+                agentStates[index] = agentStates[index].replace(scaredTimer=5)
+            states.append(scared)
+    return states
+
+class FeaturesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.states = sampleStates(random.Random(21))
+
+    def makeBatches(self):
+        batches = {}
+        for gameState in self.states:
+            text = gameState.data.layout.layoutText
+            if tuple(text) not in batches:
+                batches[tuple(text)] = features.LeafBatch(gameState.data.layout)
+            batches[tuple(text)].add(gameState)
+        for batch in batches.values():
+            batch.getArrays()
+        return batches.values()
+
+    def testEveryFeatureHasBothForms(self):
+        self.assertEqual(set(features.FEATURE_CODE), set(features.FEATURES))
+
+    def testBatchFeaturesMatchScalarFeatures(self):
+        for batch in self.makeBatches():
+            extractor = features.getFeatureExtractor(batch.layout)
+            states = [gameState for gameState in self.states if gameState.data.layout.layoutText == batch.layout.layoutText]
+            batchFeatures = extractor.getBatchFeatures(batch)
+            for row, gameState in zip(batchFeatures, states):
+                scalar = features.ALL_FEATURES(gameState)
+                for name, batchValue, value in zip(features.FEATURES, row, scalar):
+                    self.assertAlmostEqual(batchValue, value, places=9, msg=name)
+            # each feature on its own, as a LinearEvaluation compiles it
+            for i, name in enumerate(features.FEATURES):
+                single = features.compileFeatures([name])
+                column = extractor.getBatchFeatures(batch, [name])[:, 0]
+                for batchValue, gameState in zip(column, states):
+                    self.assertAlmostEqual(batchValue, single(gameState)[0], places=9, msg=name)
+                    self.assertAlmostEqual(batchValue, batchFeatures[states.index(gameState), i], places=9)
+
+    def testLinearEvaluationBatchesMatchCalls(self):
+        rand = random.Random(5)
+        for trial in range(5):
+            weights = dict((name, rand.uniform(-2, 2)) for name in rand.sample(features.FEATURES, 6))
+            evaluation = features.LinearEvaluation(weights)
+            for batch in self.makeBatches():
+                states = [gameState for gameState in self.states if gameState.data.layout.layoutText == batch.layout.layoutText]
+                for batchValue, gameState in zip(evaluation.batchEvaluate(batch), states):
+                    self.assertAlmostEqual(batchValue, evaluation(gameState), places=6)
+
+    def testExtractorIsKeptOnTheLayout(self):
+        layout = self.states[0].data.layout
+        extractor = features.getFeatureExtractor(layout)
+        self.assertTrue(layout.featureExtractor is extractor)
+        self.assertTrue(features.getFeatureExtractor(layout.deepCopy()) is extractor)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+# test_mctsAgent.py
+# -----------------
+# Checks that MCTSAgent keeps to the time the rules give it.
+# Run from the project directory with: python -m pytest tests
+
+import unittest
+
+from gameStates import playGame
+from multiAgents import MCTSAgent
+
+class MCTSAgentTest(unittest.TestCase):
+
+    def testDefaultMoveTime(self):
+        agent = MCTSAgent()
+        agent.setMoveTimeLimit(30, 30)
+        self.assertAlmostEqual(agent.getMoveBudget(), 0.075)
+        agent.setMoveTimeLimit(30)
+        self.assertAlmostEqual(agent.getMoveBudget(), 0.15)
+
+    def testFinishesATimedGame(self):
+        game = playGame('smallClassic', MCTSAgent(seed='0'), timeout=2)
+        self.assertTrue(game.gameOver)
+        self.assertFalse(game.agentTimeout)
+
+if __name__ == '__main__':
+    unittest.main()
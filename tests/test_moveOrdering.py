@@ -0,0 +1,59 @@
+# test_moveOrdering.py
+# --------------------
+# Checks that MoveOrdering only changes the order alpha-beta tries moves in:
+# the moves and values found stay the same and fewer nodes are searched.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+from gameStates import newGame, randomLine
+from multiAgents import AlphaBetaAgent, MoveOrdering
+
+ORDERINGS = ['static', 'killer', 'history', 'pv+killer+history+static']
+
+class MoveOrderingTest(unittest.TestCase):
+
+    def testUnknownHeuristicsAreRejected(self):
+        self.assertRaises(Exception, MoveOrdering, 'killer+best')
+
+    def testKillersAreTheTwoNewestCutoffMovesAtAPly(self):
+        ordering = MoveOrdering('killer')
+        gameState = newGame('openClassic', 1)
+        for action in [0, 2, 0, 3]:
+            ordering.recordCutoff(gameState, 0, 1, action, 2)
+        # a move that is already a killer keeps its place
+        self.assertEqual(ordering.order(gameState, 0, 1, [0, 1, 2, 3]), [3, 2, 0, 1])
+        # other plies keep the legal order
+        self.assertEqual(ordering.order(gameState, 0, 2, [0, 1, 2, 3]), [0, 1, 2, 3])
+        ordering.newMove()
+        self.assertEqual(ordering.order(gameState, 0, 1, [0, 1, 2, 3]), [0, 1, 2, 3])
+
+    def testOrderingKeepsMovesAndValues(self):
+        for name in ['smallClassic', 'mediumClassic']:
+            states = randomLine(name, 10, random.Random(13), numGhosts=2)
+            plain = AlphaBetaAgent(depth='3', evalFn='betterEvaluationFunction')
+            expected = [plain.searchRoot(gameState, 3) for gameState in states]
+            for heuristics in ORDERINGS:
+                agent = AlphaBetaAgent(depth='3', evalFn='betterEvaluationFunction', ordering=heuristics)
+                for gameState, (action, value) in zip(states, expected):
+                    agent.moveOrdering.newMove()
+                    found, foundValue = agent.searchRoot(gameState, 3)
+                    self.assertAlmostEqual(foundValue, value, places=9)
+                    # moves of equal value may be tried, and so kept, in another order
+                    if found != action:
+                        self.assertAlmostEqual(agent.searchRoot(gameState, 3, actions=[found])[1], value, places=9)
+
+    def testOrderingSearchesFewerNodes(self):
+        for name in ['smallClassic', 'mediumClassic']:
+            states = randomLine(name, 10, random.Random(13), numGhosts=2)
+            plain = AlphaBetaAgent(iterativeDeepening='True', maxDepth='3', moveTime='100')
+            ordered = AlphaBetaAgent(iterativeDeepening='True', maxDepth='3', moveTime='100',
+                                     ordering='pv+killer+history+static')
+            for gameState in states:
+                plain.getAction(gameState)
+                ordered.getAction(gameState)
+            self.assertTrue(sum(ordered.nodeCounts) <= sum(plain.nodeCounts))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# test_rolloutSimulator.py
+# ------------------------
+# Plays random games on GameState and RolloutSimulator side by side and checks
+# that the compact state keeps up with the full rules move for move.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+from gameStates import LAYOUTS, newGame
+from game import RolloutSimulator
+
+class RolloutSimulatorTest(unittest.TestCase):
+
+    def playRandomGame(self, name, rand, maxRounds=300):
+        gameState = newGame(name)
+        simulator = RolloutSimulator(gameState)
+        state = simulator.getInitialState(gameState)
+        for round in range(maxRounds):
+            for agentIndex in range(gameState.getNumAgents()):
+                if gameState.isWin() or gameState.isLose():
+                    return
+                codes = tuple(gameState.getLegalActionCodes(agentIndex))
+                self.assertEqual(tuple(simulator.getLegalActionCodes(state, agentIndex)), codes,
+                                 '%s: legal moves of agent %d in round %d' % (name, agentIndex, round))
+                code = rand.choice(codes)
+                gameState = gameState.generateSuccessor(agentIndex, code)
+                simulator.apply(state, agentIndex, code)
+                self.assertEqual(state, simulator.getInitialState(gameState),
+                                 '%s: agent %d in round %d' % (name, agentIndex, round))
+
+    def testRandomGames(self):
+        rand = random.Random(17)
+        for name in LAYOUTS:
+            for game in range(8):
+                self.playRandomGame(name, rand)
+
+    def testCopiesAreIndependent(self):
+        gameState = newGame('smallClassic')
+        simulator = RolloutSimulator(gameState)
+        state = simulator.getInitialState(gameState)
+        copy = state[:]
+        code = simulator.getLegalActionCodes(copy, 0)[0]
+        simulator.apply(copy, 0, code)
+        self.assertEqual(state, simulator.getInitialState(gameState))
+        self.assertNotEqual(state, copy)
+
+if __name__ == '__main__':
+    unittest.main()
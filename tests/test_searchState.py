@@ -0,0 +1,89 @@
+# test_searchState.py
+# -------------------
+# Walks random lines of play with SearchState.apply() and undo() and checks
+# every node against the GameState that generateSuccessor() reaches.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+from gameStates import LAYOUTS, newGame
+from game import SearchState
+
+class SearchStateTest(unittest.TestCase):
+
+    def assertSameNode(self, state, gameState):
+        self.assertEqual(state, gameState)
+        self.assertEqual(state.getScore(), gameState.getScore())
+        self.assertEqual(state.isWin(), gameState.isWin())
+        self.assertEqual(state.isLose(), gameState.isLose())
+        self.assertEqual(state.getNumFood(), gameState.getNumFood())
+        self.assertEqual(state.data.getKey(), gameState.data.getKey())
+        data = state.data
+        self.assertEqual(data.getKey(), data.layout.getZobristTable().stateKey(
+            data.food, data.capsules, data.agentStates))
+        for agentIndex in range(gameState.getNumAgents()):
+            agentState = data.agentStates[agentIndex]
+            expected = gameState.data.agentStates[agentIndex]
+            self.assertEqual(agentState.getPosition(), expected.getPosition())
+            self.assertEqual(agentState.getDirection(), expected.getDirection())
+            self.assertEqual(agentState.scaredTimer, expected.scaredTimer)
+            if not (gameState.isWin() or gameState.isLose()):
+                self.assertEqual(state.getLegalActions(agentIndex), gameState.getLegalActions(agentIndex))
+
+    def testRandomWalks(self):
+        rand = random.Random(5)
+        terminals = 0
+        for name in LAYOUTS:
+            lineage = [newGame(name)]
+            state = SearchState(lineage[0])
+            for step in range(1000):
+                gameState = lineage[-1]
+                if len(lineage) > 1 and (gameState.isWin() or gameState.isLose() or rand.random() < 0.1):
+                    state.undo()
+                    lineage.pop()
+                elif gameState.isWin() or gameState.isLose():
+                    break
+                else:
+                    agentIndex = (len(lineage) - 1) % gameState.getNumAgents()
+                    action = rand.choice(gameState.getLegalActions(agentIndex))
+                    state.apply(agentIndex, action)
+                    lineage.append(gameState.generateSuccessor(agentIndex, action))
+                self.assertSameNode(state, lineage[-1])
+                self.assertEqual(len(state.history), len(lineage) - 1)
+                terminals += lineage[-1].isWin() or lineage[-1].isLose()
+        self.assertTrue(terminals > 0)
+
+    def testUndoToTheRoot(self):
+        rand = random.Random(9)
+        root = newGame('mediumClassic')
+        state = SearchState(root)
+        moves = 0
+        while not (state.isWin() or state.isLose()):
+            agentIndex = moves % state.getNumAgents()
+            state.apply(agentIndex, rand.choice(state.getLegalActions(agentIndex)))
+            moves += 1
+        self.assertTrue(state.isLose() or state.isWin())
+        while state.history:
+            state.undo()
+        self.assertSameNode(state, root)
+
+    def testSnapshot(self):
+        rand = random.Random(3)
+        gameState = newGame('smallClassic')
+        state = SearchState(gameState)
+        for moves in range(40):
+            agentIndex = moves % gameState.getNumAgents()
+            if gameState.isWin() or gameState.isLose():
+                break
+            action = rand.choice(gameState.getLegalActions(agentIndex))
+            state.apply(agentIndex, action)
+            gameState = gameState.generateSuccessor(agentIndex, action)
+        snapshot = state.snapshot()
+        self.assertSameNode(snapshot, gameState)
+        while state.history:
+            state.undo()
+        self.assertSameNode(snapshot, gameState)
+
+if __name__ == '__main__':
+    unittest.main()
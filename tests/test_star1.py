@@ -0,0 +1,63 @@
+# test_star1.py
+# -------------
+# Checks that Star1 pruning in ExpectimaxAgent (bounded=True) skips subtrees
+# without changing the moves or values plain expectimax finds.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+from gameStates import randomLine
+from multiAgents import ExpectimaxAgent, scoreEvaluationFunction, scoreValueBounds
+
+class Star1Test(unittest.TestCase):
+
+    def testScoreBoundsKeepTheMoves(self):
+        for ghostModel in ['random', 'directional']:
+            for name in ['smallClassic', 'mediumClassic', 'minimaxClassic']:
+                plain = ExpectimaxAgent(depth='2', ghostModel=ghostModel)
+                bounded = ExpectimaxAgent(depth='2', ghostModel=ghostModel, bounded='True')
+                for gameState in randomLine(name, 10, random.Random(16), numGhosts=2):
+                    self.assertEqual(bounded.searchRoot(gameState), plain.searchRoot(gameState))
+
+    def testTightBoundsPruneAndKeepTheMoves(self):
+        # the lowest and highest leaf values are the tightest bounds that
+        # hold, so they prune the most
+        pruned = 0
+        for ghostModel in ['random', 'directional']:
+            for name in ['smallClassic', 'mediumClassic', 'minimaxClassic']:
+                plain = ExpectimaxAgent(depth='3', ghostModel=ghostModel)
+                bounded = ExpectimaxAgent(depth='3', ghostModel=ghostModel, bounded='True')
+                for gameState in randomLine(name, 6, random.Random(16), numGhosts=2):
+                    leaves = []
+                    def evaluate(leaf):
+                        leaves.append(scoreEvaluationFunction(leaf))
+                        return leaves[-1]
+                    plain.evaluationFunction = evaluate
+                    action, value = plain.searchRoot(gameState)
+                    bounded.lowerBound, bounded.upperBound = min(leaves), max(leaves)
+                    self.assertEqual(bounded.getAction(gameState), plain.actionName(action))
+                    found, foundValue = bounded.searchRoot(gameState)
+                    self.assertEqual(found, action)
+                    self.assertAlmostEqual(foundValue, value, places=9)
+                pruned += sum(bounded.prunedCounts)
+        self.assertTrue(pruned > 0)
+
+    def testScoreBoundsHoldAtTheLeaves(self):
+        for gameState in randomLine('smallClassic', 10, random.Random(16), numGhosts=2):
+            lower, upper = scoreValueBounds(gameState, 1)
+            leaves = [gameState]
+            for agentIndex in range(gameState.getNumAgents()):
+                successors = []
+                for state in leaves:
+                    if state.isWin() or state.isLose():
+                        successors.append(state)
+                    else:
+                        successors.extend(state.generateSuccessor(agentIndex, action)
+                                          for action in state.getLegalActions(agentIndex))
+                leaves = successors
+            for leaf in leaves:
+                self.assertTrue(lower <= leaf.getScore() <= upper)
+
+if __name__ == '__main__':
+    unittest.main()
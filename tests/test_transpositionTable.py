@@ -0,0 +1,93 @@
+# test_transpositionTable.py
+# --------------------------
+# Checks util.TranspositionTable's bounds and replacement, and that searches
+# with a table find the same moves and values as searches without one.
+# Run from the project directory with: python -m pytest tests
+
+import random
+import unittest
+
+import util
+from gameStates import randomLine
+from multiAgents import AlphaBetaAgent, ExpectimaxAgent, MinimaxAgent
+
+TABLE = util.TranspositionTable
+
+class TranspositionTableTest(unittest.TestCase):
+
+    def testBoundsOnlySettleOutsideTheWindow(self):
+        table = TABLE(10)
+        table.store('exact', 2, 5)
+        table.store('lower', 2, 5, TABLE.LOWER)
+        table.store('upper', 2, 5, TABLE.UPPER)
+        self.assertEqual(table.probe('exact', 0, 3), 5)
+        self.assertEqual(table.probe('lower', 0, 5), 5)
+        self.assertEqual(table.probe('lower', 0, 6), None)
+        self.assertEqual(table.probe('upper', 5, 10), 5)
+        self.assertEqual(table.probe('upper', 4, 10), None)
+        self.assertEqual(table.probe('missing'), None)
+
+    def testLRUEvictsTheLeastRecentlyUsed(self):
+        table = TABLE(2)
+        table.store('a', 1, 1)
+        table.store('b', 1, 2)
+        table.probe('a')
+        table.store('c', 1, 3)
+        self.assertEqual(table.probe('a'), 1)
+        self.assertEqual(table.probe('b'), None)
+        self.assertEqual(table.probe('c'), 3)
+        self.assertEqual(table.evictions, 1)
+
+    def testDepthReplacementKeepsTheDeeperSearch(self):
+        table = TABLE(1, 'depth')
+        table.store('deep', 3, 1)
+        table.store('shallow', 2, 2)
+        self.assertEqual(table.probe('deep'), 1)
+        self.assertEqual(table.probe('shallow'), None)
+        table.store('deeper', 3, 3)
+        self.assertEqual(table.probe('deeper'), 3)
+        self.assertTrue(table.reachedHorizon('deeper'))
+        table.store('deeper', 3, 3, horizon=False)
+        self.assertFalse(table.reachedHorizon('deeper'))
+
+    def assertSameSearches(self, makeAgent, search):
+        # tables big enough to keep everything and small enough to evict,
+        # kept across the moves of a line of play as in a game
+        for name in ['smallClassic', 'mediumClassic']:
+            states = randomLine(name, 8, random.Random(11), numGhosts=2)
+            plain = makeAgent()
+            expected = [search(plain, gameState) for gameState in states]
+            for size in ['100000', '50']:
+                for replacement in ['lru', 'depth']:
+                    agent = makeAgent(transpositionTable=size, replacement=replacement)
+                    for gameState, (action, value) in zip(states, expected):
+                        found = search(agent, gameState)
+                        self.assertEqual(found[0], action)
+                        self.assertAlmostEqual(found[1], value, places=9)
+                    self.assertTrue(agent.transpositionTable.hits > 0)
+
+    def testMinimaxFindsTheSameValues(self):
+        self.assertSameSearches(lambda **args: MinimaxAgent(depth='2', **args),
+                                lambda agent, gameState: agent.searchRoot(gameState))
+
+    def testAlphaBetaFindsTheSameValues(self):
+        self.assertSameSearches(lambda **args: AlphaBetaAgent(depth='3', evalFn='betterEvaluationFunction', **args),
+                                lambda agent, gameState: agent.searchRoot(gameState, 3))
+
+    def testAlphaBetaOnlyTrustsBoundsInsideTheirWindow(self):
+        # a search that fails low leaves upper bounds on every node it cut
+        # off; a full search of the same state must not take them as values
+        for evalFn in ['scoreEvaluationFunction', 'betterEvaluationFunction']:
+            plain = AlphaBetaAgent(depth='3', evalFn=evalFn)
+            agent = AlphaBetaAgent(depth='3', evalFn=evalFn, transpositionTable='100000')
+            for gameState in randomLine('minimaxClassic', 8, random.Random(11), numGhosts=2):
+                action, value = plain.searchRoot(gameState, 3)
+                agent.searchRoot(gameState, 3, alpha=value + abs(value) + 1)
+                self.assertEqual(agent.searchRoot(gameState, 3), (action, value))
+
+    def testExpectimaxFindsTheSameValues(self):
+        self.assertSameSearches(lambda **args: ExpectimaxAgent(depth='2', **args),
+                                lambda agent, gameState: agent.searchRoot(gameState))
+
+if __name__ == '__main__':
+    unittest.main()
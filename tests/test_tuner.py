@@ -0,0 +1,79 @@
+# test_tuner.py
+# -------------
+# A small run of the weight tuner on testClassic, without worker processes.
+# Run from the project directory with: python -m pytest tests
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import features
+import tuner
+
+SETTINGS = {'layoutName': 'testClassic', 'agentName': 'AlphaBetaAgent', 'agentArgs': {'depth': '1'},
+            'ghostName': 'RandomGhost', 'numGhosts': 1, 'timeout': 30}
+# games on testClassic only differ with how far Pacman keeps from the ghost
+START = {'score': 1.0, 'nearestFood': -1.0, 'foodLeft': -4.0, 'nearestGhost': 0.0}
+
+class TunerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.leaderboard = os.path.join(self.directory, 'leaderboard.txt')
+        self.bestSpec = os.path.join(self.directory, 'best.spec')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def makeTuner(self, method):
+        return tuner.WeightTuner(START, ['nearestGhost', 'nearestFood'], range(4), method=method,
+                                 population=3, sigma=2.0, roundSize=2, seed=1, leaderboard=self.leaderboard,
+                                 bestSpec=self.bestSpec, settings=SETTINGS)
+
+    def testGamesAreSeeded(self):
+        tuner.initTunerWorker(SETTINGS)
+        for seed in range(3):
+            self.assertEqual(tuner.playTuningGame((START, seed)), tuner.playTuningGame((START, seed)))
+
+    def testRunKeepsTheBestWeights(self):
+        for method in ['random', 'es']:
+            weightTuner = self.makeTuner(method)
+            best = weightTuner.run(2)
+            self.assertEqual(len(weightTuner.candidates), 7)
+            self.assertEqual(best.getGames(), 4)
+            for candidate in weightTuner.candidates:
+                # weights that are not tuned stay where they started
+                self.assertEqual(candidate.weights['foodLeft'], -4.0)
+                if not candidate.stopped:
+                    self.assertEqual(candidate.getGames(), 4)
+                    self.assertTrue(weightTuner.rankKey(candidate) <= weightTuner.rankKey(best))
+            scores = set(candidate.getAverageScore() for candidate in weightTuner.candidates)
+            self.assertTrue(len(scores) > 1)
+            self.assertEqual(best.getAverageScore(), max(candidate.getAverageScore() for candidate in
+                                                         weightTuner.candidates if not candidate.stopped))
+            self.assertEqual(features.loadEvaluationSpec(self.bestSpec), best.weights)
+            with open(self.leaderboard) as f:
+                self.assertEqual(len(f.readlines()), 8)
+
+    def testBestSpecReadsBackExactly(self):
+        weightTuner = self.makeTuner('es')
+        weightTuner.best = tuner.Candidate(dict(START, nearestGhost=0.1234567890123), 1)
+        weightTuner.best.scores = {0: 500}
+        weightTuner.candidates = [weightTuner.best]
+        weightTuner.writeLeaderboard()
+        self.assertEqual(features.loadEvaluationSpec(self.bestSpec), weightTuner.best.weights)
+
+    def testHopelessCandidatesAreClearlyWorse(self):
+        weightTuner = self.makeTuner('es')
+        weightTuner.best = tuner.Candidate(START, 0)
+        weightTuner.best.scores = {0: 500, 1: 400, 2: 450}
+        worse = tuner.Candidate(START, 1)
+        worse.scores = {0: 100, 1: 90, 2: 120}
+        close = tuner.Candidate(START, 1)
+        close.scores = {0: 520, 1: 300, 2: 450}
+        self.assertTrue(weightTuner.isHopeless(worse))
+        self.assertFalse(weightTuner.isHopeless(close))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,349 @@
+# tuner.py
+# --------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Tunes the weights of a linear evaluation spec (see features.py) by playing
+headless games with them, farmed out to a pool of processes.
+
+Every candidate weight set plays the same fixed set of seeded games, so
+candidates are compared on equal terms.  The games are played in rounds, and
+after each round a candidate whose scores on the games played so far fall
+clearly below the best's on the same games is dropped.  New candidates are
+drawn by random search around the best weights so far, or by a simple
+evolution strategy that moves a mean and per-weight step sizes toward the
+best of each generation (CMA-ES with a diagonal covariance).
+
+The leaderboard of all the weight sets tried is rewritten after every
+generation.  To tune the weights of a spec for ExpectimaxAgent at depth 2:
+
+  python tuner.py --spec start.spec -p ExpectimaxAgent -a depth=2 -l smallClassic
+"""
+
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+import features
+import layout
+import pacman
+import textDisplay
+
+# The settings of the games a worker process plays
+TUNER_WORKER = {}
+
+def initTunerWorker(settings):
+    TUNER_WORKER.update(settings)
+    TUNER_WORKER['layout'] = layout.getLayout(settings['layoutName'])
+    TUNER_WORKER['agentType'] = pacman.loadAgent(settings['agentName'], True)
+    TUNER_WORKER['ghostType'] = pacman.loadAgent(settings['ghostName'], True)
+
+def playTuningGame(task):
+    """
+    Plays the game of one seed with a weight set, in a worker process, and
+    returns (score, whether Pacman won).
+    """
+    weights, seed = task
+    settings = TUNER_WORKER
+    random.seed(seed)
+    agentOpts = dict(settings['agentArgs'])
+    agentOpts.update(weights)
+    agentOpts['evalFn'] = 'spec'
+    agent = settings['agentType'](**agentOpts)
+    ghosts = [settings['ghostType'](i + 1) for i in range(settings['numGhosts'])]
+    rules = pacman.ClassicGameRules(settings['timeout'])
+    game = rules.newGame(settings['layout'], agent, ghosts, textDisplay.NullGraphics(), True, False)
+    try:
+        game.run()
+    finally:
+        if hasattr(agent, 'close'):
+            agent.close()
+    return game.state.getScore(), game.state.isWin()
+
+class Candidate:
+    """
+    A weight set and the results of the games it has played, by seed.
+    """
+
+    def __init__(self, weights, generation):
+        self.weights = weights
+        self.generation = generation
+        self.scores = {}
+        self.wins = {}
+        self.stopped = False
+
+    def getGames(self):
+        return len(self.scores)
+
+    def getAverageScore(self):
+        return sum(self.scores.values()) / float(len(self.scores)) if self.scores else float('-inf')
+
+    def getWinRate(self):
+        return sum(self.wins.values()) / float(len(self.wins)) if self.wins else 0.0
+
+class WeightTuner:
+    """
+    Searches the weights of the features in names, starting from the weight
+    set start (which may weigh other features too; those are kept fixed).
+    Each candidate plays the games of seeds, roundSize at a time, and is
+    dropped once the mean of its score differences to the best candidate on
+    the same games is below 0 by more than margin standard errors.
+    """
+
+    def __init__(self, start, names, seeds, method='es', population=8, sigma=0.5,
+                 roundSize=4, margin=2.0, workers=0, seed=0, leaderboard=None, bestSpec=None,
+                 settings=None):
+        if method not in ('random', 'es'):
+            raise Exception('Unknown tuning method: ' + method)
+        self.start = dict(start)
+        self.names = list(names)
+        self.seeds = list(seeds)
+        self.method = method
+        self.population = population
+        self.roundSize = roundSize
+        self.margin = margin
+        self.random = random.Random(seed)
+        self.leaderboard = leaderboard
+        self.bestSpec = bestSpec
+        self.candidates = []
+        self.best = None
+        # The mean and per-weight step sizes candidates are drawn with
+        self.mean = [self.start.get(name, 0.0) for name in self.names]
+        self.steps = [sigma * max(abs(weight), 1.0) for weight in self.mean]
+        self.workers = workers
+        self.settings = settings
+        self.pool = None
+        if workers > 0:
+            self.pool = multiprocessing.Pool(workers, initializer=initTunerWorker, initargs=(settings,))
+        else:
+            initTunerWorker(settings)
+
+    def getWeights(self, vector):
+        weights = dict(self.start)
+        weights.update(zip(self.names, vector))
+        return weights
+
+    def run(self, generations):
+        self.evaluate([Candidate(self.start, 0)])
+        for generation in range(1, generations + 1):
+            start = time.time()
+            vectors = [self.sample() for i in range(self.population)]
+            candidates = [Candidate(self.getWeights(vector), generation) for vector in vectors]
+            self.evaluate(candidates)
+            if self.method == 'es':
+                self.adapt(vectors, candidates)
+            finished = [c for c in candidates if not c.stopped]
+            print('Generation %d: %d of %d candidates played every game, best %.1f (%.2f wins) in %.1fs' %
+                  (generation, len(finished), len(candidates), self.best.getAverageScore(),
+                   self.best.getWinRate(), time.time() - start))
+        if self.pool != None:
+            self.pool.close()
+            self.pool.join()
+        return self.best
+
+    def sample(self):
+        """
+        Draws the weights of the features in self.names for a new candidate.
+        """
+        if self.method == 'random':
+            center = [self.best.weights.get(name, 0.0) for name in self.names]
+        else:
+            center = self.mean
+        return [weight + step * self.random.gauss(0, 1) for weight, step in zip(center, self.steps)]
+
+    def adapt(self, vectors, candidates):
+        """
+        Moves the mean to the weighted mean of the better half of a
+        generation and each step size toward the spread of that half along
+        its weight.
+        """
+        ranked = sorted(zip(candidates, vectors), key=lambda pair: self.rankKey(pair[0]), reverse=True)
+        parents = max(1, len(ranked) // 2)
+        ranks = [math.log(parents + 0.5) - math.log(i + 1) for i in range(parents)]
+        total = sum(ranks)
+        ranks = [rank / total for rank in ranks]
+        selected = [vector for candidate, vector in ranked[:parents]]
+        oldMean = self.mean
+        self.mean = [sum(rank * vector[j] for rank, vector in zip(ranks, selected))
+                     for j in range(len(self.names))]
+        learningRate = 0.3
+        for j in range(len(self.names)):
+            spread = sum(rank * (vector[j] - oldMean[j]) ** 2 for rank, vector in zip(ranks, selected))
+            self.steps[j] = math.sqrt((1 - learningRate) * self.steps[j] ** 2 + learningRate * spread)
+
+    def evaluate(self, candidates):
+        """
+        Plays the candidates' games round by round, dropping hopeless ones.
+        """
+        self.candidates += candidates
+        alive = list(candidates)
+        for first in range(0, len(self.seeds), self.roundSize):
+            seeds = self.seeds[first:first + self.roundSize]
+            tasks = [(candidate.weights, seed) for candidate in alive for seed in seeds]
+            if self.pool != None:
+                results = self.pool.map(playTuningGame, tasks)
+            else:
+                results = [playTuningGame(task) for task in tasks]
+            for (weights, seed), (score, win), candidate in zip(
+                    tasks, results, [c for c in alive for seed in seeds]):
+                candidate.scores[seed] = score
+                candidate.wins[seed] = win
+            if first + self.roundSize < len(self.seeds):
+                for candidate in alive:
+                    if self.isHopeless(candidate):
+                        candidate.stopped = True
+                alive = [candidate for candidate in alive if not candidate.stopped]
+            if not alive:
+                break
+        for candidate in candidates:
+            if not candidate.stopped and (self.best == None or self.rankKey(candidate) > self.rankKey(self.best)):
+                self.best = candidate
+        self.writeLeaderboard()
+
+    def isHopeless(self, candidate):
+        """
+        Whether candidate scored clearly worse than the best candidate on the
+        games it has played.
+        """
+        if self.best == None:
+            return False
+        differences = [score - self.best.scores[seed] for seed, score in candidate.scores.items()]
+        n = len(differences)
+        if n < 2:
+            return False
+        mean = sum(differences) / float(n)
+        variance = sum((d - mean) ** 2 for d in differences) / float(n - 1)
+        return mean + self.margin * math.sqrt(variance / n) < 0
+
+    def rankKey(self, candidate):
+        # candidates that played every game come first
+        return (not candidate.stopped, candidate.getAverageScore(), candidate.getWinRate())
+
+    def writeLeaderboard(self):
+        ranked = sorted(self.candidates, key=self.rankKey, reverse=True)
+        if self.leaderboard != None:
+            with open(self.leaderboard, 'w') as f:
+                f.write('# rank  average score  win rate  games  generation  weights\n')
+                for rank, candidate in enumerate(ranked):
+                    f.write('%d\t%.1f\t%.3f\t%d%s\t%d\t%s\n' % (
+                        rank + 1, candidate.getAverageScore(), candidate.getWinRate(),
+                        candidate.getGames(), ' (stopped)' if candidate.stopped else '',
+                        candidate.generation, ' '.join('%s=%.6g' % (name, candidate.weights[name])
+                                                       for name in features.FEATURES
+                                                       if name in candidate.weights)))
+        if self.bestSpec != None and self.best != None:
+            with open(self.bestSpec, 'w') as f:
+                f.write('# %.1f average score, %.3f win rate over %d games\n' % (
+                    self.best.getAverageScore(), self.best.getWinRate(), self.best.getGames()))
+                for name in features.FEATURES:
+                    if name in self.best.weights:
+                        f.write('%s: %r\n' % (name, self.best.weights[name]))
+
+def default(str):
+    return str + ' [Default: %default]'
+
+def readCommand(argv):
+    """
+    Processes the command used to run the tuner from the command line.
+    """
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python tuner.py <options>
+    EXAMPLES:   (1) python tuner.py --spec start.spec -a depth=2
+                    - tunes every weight of start.spec for ExpectimaxAgent
+                (2) python tuner.py --spec start.spec --features nearestFood,nearestScaredGhost --method random
+                    - tunes two of its weights by random search
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('--spec', dest='spec',
+                      help='the evaluation spec file with the starting weights')
+    parser.add_option('--features', dest='features',
+                      help='comma separated features to tune [Default: those weighted in the spec]', default=None)
+    parser.add_option('-l', '--layout', dest='layout',
+                      help=default('the LAYOUT_FILE the games are played on'),
+                      metavar='LAYOUT_FILE', default='smallClassic')
+    parser.add_option('-p', '--pacman', dest='pacman',
+                      help=default('the search agent TYPE that plays with the weights'),
+                      metavar='TYPE', default='ExpectimaxAgent')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs',
+                      help='Comma separated values sent to the agent. e.g. "depth=2,evalCache=10000"')
+    parser.add_option('-g', '--ghosts', dest='ghost',
+                      help=default('the ghost agent TYPE in the ghostAgents module to use'),
+                      metavar='TYPE', default='RandomGhost')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts',
+                      help=default('The maximum number of ghosts to use'), default=4)
+    parser.add_option('-n', '--numGames', dest='numGames', type='int',
+                      help=default('the number of seeded GAMES each weight set plays'), metavar='GAMES', default=20)
+    parser.add_option('--firstSeed', dest='firstSeed', type='int',
+                      help=default('the seed of the first game; the others follow it'), default=0)
+    parser.add_option('--generations', dest='generations', type='int',
+                      help=default('the number of generations of candidates'), default=10)
+    parser.add_option('--population', dest='population', type='int',
+                      help=default('the number of candidates in a generation'), default=8)
+    parser.add_option('--method', dest='method',
+                      help=default('how candidates are drawn: random or es'), default='es')
+    parser.add_option('--sigma', dest='sigma', type='float',
+                      help=default('the first step size, relative to each weight (at least 1)'), default=0.5)
+    parser.add_option('--roundSize', dest='roundSize', type='int',
+                      help=default('games per candidate between checks for hopeless candidates'), default=4)
+    parser.add_option('--margin', dest='margin', type='float',
+                      help=default('standard errors below the best at which a candidate is dropped'), default=2.0)
+    parser.add_option('--workers', dest='workers', type='int',
+                      help='the number of processes that play games [Default: one per CPU]', default=None)
+    parser.add_option('--seed', dest='seed', type='int',
+                      help=default('the seed of the tuner\'s own random choices'), default=0)
+    parser.add_option('--timeout', dest='timeout', type='int',
+                      help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--leaderboard', dest='leaderboard',
+                      help=default('the file the ranked weight sets are written to'), default='leaderboard.txt')
+    parser.add_option('--bestSpec', dest='bestSpec',
+                      help=default('the spec file the best weights are written to'), default='best.spec')
+
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.spec == None:
+        raise Exception('The tuner needs a --spec with the starting weights')
+
+    start = features.loadEvaluationSpec(options.spec)
+    if options.features != None:
+        names = options.features.split(',')
+        for name in names:
+            if name not in features.FEATURES:
+                raise Exception('Unknown feature: ' + name)
+    else:
+        names = [name for name in features.FEATURES if name in start]
+    if layout.getLayout(options.layout) == None:
+        raise Exception("The layout " + options.layout + " cannot be found")
+    agentArgs = pacman.parseAgentArgs(options.agentArgs)
+    if 'evalFn' in agentArgs:
+        raise Exception('The tuner sets evalFn itself')
+    workers = options.workers
+    if workers == None:
+        workers = multiprocessing.cpu_count()
+
+    settings = {'layoutName': options.layout, 'agentName': options.pacman, 'agentArgs': agentArgs,
+                'ghostName': options.ghost, 'numGhosts': options.numGhosts, 'timeout': options.timeout}
+    tuner = WeightTuner(start, names, range(options.firstSeed, options.firstSeed + options.numGames),
+                        method=options.method, population=options.population, sigma=options.sigma,
+                        roundSize=options.roundSize, margin=options.margin, workers=workers,
+                        seed=options.seed, leaderboard=options.leaderboard, bestSpec=options.bestSpec,
+                        settings=settings)
+    return tuner, options.generations
+
+if __name__ == '__main__':
+    tuner, generations = readCommand(sys.argv[1:])
+    best = tuner.run(generations)
+    print('Best: %.1f average score, %.2f win rate' % (best.getAverageScore(), best.getWinRate()))
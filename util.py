@@ -31,6 +31,7 @@ import inspect
 import heapq
 import random
 import io
+from collections import OrderedDict
 
 
 class FixedRandom:
@@ -233,6 +234,180 @@ class PriorityQueueWithFunction(PriorityQueue):
         PriorityQueue.push(self, item, self.priorityFunction(item))
 
 
+class TranspositionTable:
+    """
+    A bounded map from search positions to the values found for them, so a
+    search does not expand the same position twice when different move
+    orders lead to it.  Keys should name the position, the remaining depth
+    and the agent to move; each entry records whether its value is EXACT or
+    only a LOWER or UPPER bound (from an alpha-beta cutoff), and whether the
+    search behind it was cut off by the depth limit.
+
+    When the table is full, 'lru' replacement evicts the least recently used
+    entry, while 'depth' replacement hashes each key to one slot and lets a
+    new entry displace the old one only if it was searched at least as deep.
+    """
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, size, replacement='lru'):
+        if replacement not in ('lru', 'depth'):
+            raise Exception('Unknown replacement scheme: ' + str(replacement))
+        self.size = size
+        self.replacement = replacement
+        self.clear()
+
+    def clear(self):
+        if self.replacement == 'lru':
+            self.entries = OrderedDict()
+        else:
+            self.entries = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """
+        Returns the (value, bound) stored for key, or None.
+        """
+        if self.replacement == 'lru':
+            entry = self.entries.get(key)
+            if entry != None:
+                self.entries.move_to_end(key)
+        else:
+            entry = self.entries[hash(key) % self.size]
+            if entry != None and entry[0] != key:
+                entry = None
+        if entry == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[2], entry[3]
+
+    def store(self, key, depth, value, bound=EXACT, horizon=True):
+        """
+        Records the value of key, found with depth plies left to search.
+        horizon says whether that search reached the depth limit anywhere.
+        """
+        entry = (key, depth, value, bound, horizon)
+        if self.replacement == 'lru':
+            if key not in self.entries and len(self.entries) >= self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+        else:
+            slot = hash(key) % self.size
+            old = self.entries[slot]
+            if old != None and old[0] != key:
+                if old[1] > depth:
+                    return
+                self.evictions += 1
+            self.entries[slot] = entry
+
+    def probe(self, key, alpha=float('-inf'), beta=float('inf')):
+        """
+        Returns a stored value that settles key within the window
+        (alpha, beta): an exact value, a lower bound of at least beta or an
+        upper bound of at most alpha.  Returns None otherwise.
+        """
+        entry = self.lookup(key)
+        if entry == None:
+            return None
+        value, bound = entry
+        if bound == TranspositionTable.EXACT:
+            return value
+        if bound == TranspositionTable.LOWER and value >= beta:
+            return value
+        if bound == TranspositionTable.UPPER and value <= alpha:
+            return value
+        return None
+
+    def reachedHorizon(self, key):
+        """
+        Returns whether the search stored for key reached the depth limit
+        (True if key is not stored).
+        """
+        if self.replacement == 'lru':
+            entry = self.entries.get(key)
+        else:
+            entry = self.entries[hash(key) % self.size]
+            if entry != None and entry[0] != key:
+                entry = None
+        return entry == None or entry[4]
+
+    def getStats(self):
+        return {'size': self.size, 'entries': len(self),
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+    def __len__(self):
+        if self.replacement == 'lru':
+            return len(self.entries)
+        return sum(1 for entry in self.entries if entry != None)
+
+
+class EvaluationCache:
+    """
+    Wraps an evaluation function so that it is computed once per position:
+    values are kept in an LRU map of at most size entries, keyed like
+    GameState hashes by the Zobrist key of the board and the score.  States
+    without one (the autograder's trees) are evaluated every time.
+
+    The wrapper is called like the function it wraps and passes its
+    valueBounds and batchEvaluate through (the latter uncached).  It is
+    pickled without its entries.
+    """
+
+    def __init__(self, evaluationFunction, size):
+        self.evaluationFunction = evaluationFunction
+        self.size = size
+        for name in ('valueBounds', 'batchEvaluate'):
+            if hasattr(evaluationFunction, name):
+                setattr(self, name, getattr(evaluationFunction, name))
+        self.clear()
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __call__(self, gameState):
+        data = getattr(gameState, 'data', None)
+        if data == None:
+            return self.evaluationFunction(gameState)
+        key = (data.getKey(), data.score)
+        entries = self.entries
+        value = entries.get(key)
+        if value != None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = self.evaluationFunction(gameState)
+        if len(entries) >= self.size:
+            entries.popitem(last=False)
+            self.evictions += 1
+        entries[key] = value
+        return value
+
+    def getStats(self):
+        return {'size': self.size, 'entries': len(self.entries),
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+    def getHitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups > 0 else 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['entries'] = OrderedDict()
+        return state
+
+
 def manhattanDistance(xy1, xy2):
     "Returns the Manhattan distance between points xy1 and xy2"
     return abs(xy1[0] - xy2[0]) + abs(xy1[1] - xy2[1])
@@ -631,6 +806,14 @@ def lookup(name, namespace):
         raise Exception('%s not found as a method or class' % name)
 
 
+def parseBoolean(value):
+    """
+    Reads an on/off option given through agentArgs.  'True' and bare flags
+    (which pacman.parseAgentArgs turns into 1) mean on.
+    """
+    return str(value).lower() in ['true', '1', 'yes']
+
+
 def pause():
     """
     Pauses the output stream awaiting user feedback.